@@ -1,36 +1,126 @@
-from sentence_transformers import SentenceTransformer, util
 import json
-import torch
+import os
 import random
-from transformers import pipeline
+import threading
+import time
+import embeddings
+import model_registry
+import vector_index
+
+# The emotion model is registered here and only built on first use (or by
+# model_registry.preload()); sentence embeddings come from embeddings.py,
+# using CHATBOT_EMBEDDING_MODEL
+def _load_emotion():
+    from transformers import pipeline
+    return pipeline("sentiment-analysis", model="j-hartmann/emotion-english-distilroberta-base")
+
+model_registry.register("emotion", _load_emotion)
+
+MODEL_NAME = embeddings.CHATBOT_EMBEDDING_MODEL
+# Minimum cosine similarity for an intent or crime match. all-MiniLM-L6-v2
+# scores short paraphrases lower than paraphrase-MiniLM-L6-v2, so this sits
+# below the 0.6 used with that model; set 0.6 when opting back into it.
+SIMILARITY_THRESHOLD = float(os.environ.get('CHATBOT_SIMILARITY_THRESHOLD', 0.5))
+
+INTENTS_PATH = './data/intents.json'
+CRIMES_PATH = './data/crime_description.json'
+INTENT_INDEX_PATH = os.path.join(vector_index.INDEX_DIR, 'chatbot_intents.npz')
+CRIME_INDEX_PATH = os.path.join(vector_index.INDEX_DIR, 'chatbot_crimes.npz')
 
 class CrimeBot:
-    def __init__(self):
+    def __init__(self, index_kind=None):
+        # 'flat' (exact) or 'ivf' (approximate); see vector_index.py
+        self.index_kind = index_kind or vector_index.DEFAULT_INDEX
+        self._snapshot = None
+        self._lock = threading.Lock()
+        # Intents and crime descriptions are read now; their vector indexes
+        # are loaded or built on first use
+        self._sources()
+        model_registry.register_warmup("chatbot_indexes", self._indexed)
+
+    def _source_mtimes(self):
+        return (os.path.getmtime(INTENTS_PATH), os.path.getmtime(CRIMES_PATH))
+
+    def _read_sources(self, mtimes):
         # Load intents and crime descriptions
-        with open('./data/intents.json', 'r') as f:
-            self.intents = json.load(f)['intents']
-        with open('./data/crime_description.json', 'r') as f:
-            self.crime_descriptions = json.load(f)
-
-        # Initialize the sentence transformer model
-        self.model = SentenceTransformer('paraphrase-MiniLM-L6-v2')
-
-        # Initialize sentiment analysis pipeline
-        self.sentiment_analyzer = pipeline("sentiment-analysis", model="j-hartmann/emotion-english-distilroberta-base")
-
-        # Pre-compute embeddings for patterns and crime descriptions
-        self.intent_patterns = []
-        self.intent_embeddings = []
-        self.intent_mapping = []
-
-        for intent in self.intents:
+        with open(INTENTS_PATH, 'r') as f:
+            intents = json.load(f)['intents']
+        with open(CRIMES_PATH, 'r') as f:
+            crime_descriptions = json.load(f)
+
+        intent_patterns = []
+        intent_mapping = []
+        for intent in intents:
             for pattern in intent['patterns']:
-                self.intent_patterns.append(pattern)
-                self.intent_mapping.append(intent)
-
-        self.intent_embeddings = self.model.encode(self.intent_patterns, convert_to_tensor=True)
-        self.crime_queries = list(self.crime_descriptions.keys())
-        self.crime_embeddings = self.model.encode(self.crime_queries, convert_to_tensor=True)
+                intent_patterns.append(pattern)
+                intent_mapping.append(intent)
+
+        return {
+            'mtimes': mtimes,
+            'intents': intents,
+            'crime_descriptions': crime_descriptions,
+            'intent_patterns': intent_patterns,
+            'intent_mapping': intent_mapping,
+            'crime_queries': list(crime_descriptions.keys()),
+            'intent_index': None,
+            'crime_index': None,
+        }
+
+    def _sources(self):
+        """Current intents and crimes, re-read when either JSON file changes.
+
+        Each reload produces a new snapshot dict, so a request holding the
+        old one never sees half-updated data.
+        """
+        mtimes = self._source_mtimes()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot['mtimes'] == mtimes:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or self._snapshot['mtimes'] != mtimes:
+                self._snapshot = self._read_sources(mtimes)
+            return self._snapshot
+
+    def _indexed(self):
+        """Current snapshot with its intent and crime vector indexes in place"""
+        snapshot = self._sources()
+        if snapshot['crime_index'] is not None:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot['crime_index'] is None:
+                with model_registry.timed("chatbot_indexes"):
+                    snapshot = dict(
+                        snapshot,
+                        intent_index=vector_index.load_or_build(
+                            snapshot['intent_patterns'], self._encode, INTENT_INDEX_PATH,
+                            MODEL_NAME, self.index_kind),
+                        crime_index=vector_index.load_or_build(
+                            snapshot['crime_queries'], self._encode, CRIME_INDEX_PATH,
+                            MODEL_NAME, self.index_kind),
+                    )
+                self._snapshot = snapshot
+            return snapshot
+
+    @staticmethod
+    def _encode(texts):
+        return embeddings.encode(texts, model_name=MODEL_NAME)
+
+    @property
+    def intents(self):
+        return self._sources()['intents']
+
+    @property
+    def crime_descriptions(self):
+        return self._sources()['crime_descriptions']
+
+    @property
+    def crime_queries(self):
+        return self._sources()['crime_queries']
+
+    @property
+    def sentiment_analyzer(self):
+        return model_registry.get("emotion")
 
     def analyze_sentiment(self, user_input):
         """
@@ -39,26 +129,56 @@ class CrimeBot:
         analysis = self.sentiment_analyzer(user_input)
         return analysis[0]['label'], analysis[0]['score']
 
-    def get_response(self, user_input):
-        # Analyze user sentiment
-        sentiment, confidence = self.analyze_sentiment(user_input)
-        is_distressed = sentiment in ['sadness', 'fear', 'anger']
-
-        # Encode user input for similarity checks
-        input_embedding = self.model.encode(user_input, convert_to_tensor=True)
-
-        # Find closest intent and crime description
-        cos_scores_intents = util.cos_sim(input_embedding, self.intent_embeddings)[0]
-        best_intent_match = torch.argmax(cos_scores_intents)
-        cos_scores_crimes = util.cos_sim(input_embedding, self.crime_embeddings)[0]
-        best_crime_match = torch.argmax(cos_scores_crimes)
+    def understand(self, query, n=3):
+        """Run every model once over a query and keep all the results.
 
-        intent_similarity = cos_scores_intents[best_intent_match].item()
-        crime_similarity = cos_scores_crimes[best_crime_match].item()
-        SIMILARITY_THRESHOLD = 0.6
+        Returns the query embedding, the emotion label and confidence, the
+        best intent and crime matches with their scores, the n most similar
+        crimes, and the seconds spent in each stage under 'timings'.
+        """
+        snapshot = self._indexed()
+        timings = {}
+        start = time.perf_counter()
+        embedding = embeddings.embed_query(query, MODEL_NAME)
+        timings['embed'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        emotion, confidence = self.analyze_sentiment(query)
+        timings['emotion'] = time.perf_counter() - start
+
+        # Closest intent pattern, and enough crimes to fill the similar list
+        start = time.perf_counter()
+        intent_ids, intent_scores = snapshot['intent_index'].search(embedding, 1)
+        crime_ids, crime_scores = snapshot['crime_index'].search(embedding, n + 1)
+        timings['match'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        similar_crimes = self._similar_crimes(snapshot, crime_ids, crime_scores, query, n)
+        timings['similar'] = time.perf_counter() - start
+
+        best_crime = snapshot['crime_queries'][crime_ids[0]] if len(crime_ids) else None
+        return {
+            'query': query,
+            'embedding': embedding,
+            'emotion': emotion,
+            'emotion_score': confidence,
+            'intent': snapshot['intent_mapping'][intent_ids[0]] if len(intent_ids) else None,
+            'intent_score': float(intent_scores[0]) if len(intent_scores) else 0.0,
+            'crime': best_crime,
+            'crime_description': snapshot['crime_descriptions'][best_crime] if best_crime else None,
+            'crime_score': float(crime_scores[0]) if len(crime_scores) else 0.0,
+            'similar_crimes': similar_crimes,
+            'timings': timings,
+        }
+
+    def respond(self, understanding):
+        """Pick a reply from the output of understand()"""
+        is_distressed = understanding['emotion'] in ['sadness', 'fear', 'anger']
+        intent_similarity = understanding['intent_score']
+        crime_similarity = understanding['crime_score']
 
         # Provide comforting responses for distressed users
-        if is_distressed and confidence > 0.8:
+        if is_distressed and understanding['emotion_score'] > 0.8:
             comforting_responses = [
                 "I'm here to assist you. Please take a deep breath and share as much or as little as you're comfortable with.",
                 "I understand this might be hard to talk about. You're not alone. Let me guide you.",
@@ -71,24 +191,27 @@ class CrimeBot:
             return "I'm not sure about that. Could you please rephrase or ask about a specific crime?"
 
         if intent_similarity > crime_similarity:
-            matched_intent = self.intent_mapping[best_intent_match]
-            return random.choice(matched_intent['responses'])
+            return random.choice(understanding['intent']['responses'])
         else:
-            matched_crime = self.crime_queries[best_crime_match]
-            return self.crime_descriptions[matched_crime]
+            return understanding['crime_description']
 
-    def get_similar_crimes(self, crime_type, n=3):
-        query_embedding = self.model.encode(crime_type, convert_to_tensor=True)
-        cos_scores = util.cos_sim(query_embedding, self.crime_embeddings)[0]
-        top_results = torch.topk(cos_scores, k=min(n + 1, len(self.crime_queries)))
+    def get_response(self, user_input):
+        return self.respond(self.understand(user_input))
 
+    def _similar_crimes(self, snapshot, crime_ids, scores, crime_type, n):
         similar_crimes = []
-        for score, idx in zip(top_results[0], top_results[1]):
-            if self.crime_queries[idx].lower() != crime_type.lower():
+        for idx, score in zip(crime_ids, scores):
+            crime = snapshot['crime_queries'][idx]
+            if crime.lower() != crime_type.lower():
                 similar_crimes.append({
-                    'crime': self.crime_queries[idx],
-                    'description': self.crime_descriptions[self.crime_queries[idx]],
-                    'similarity': score.item()
+                    'crime': crime,
+                    'description': snapshot['crime_descriptions'][crime],
+                    'similarity': float(score)
                 })
 
-        return similar_crimes[:n]
\ No newline at end of file
+        return similar_crimes[:n]
+
+    def get_similar_crimes(self, crime_type, n=3):
+        snapshot = self._indexed()
+        crime_ids, scores = snapshot['crime_index'].search(embeddings.embed_query(crime_type, MODEL_NAME), n + 1)
+        return self._similar_crimes(snapshot, crime_ids, scores, crime_type, n)
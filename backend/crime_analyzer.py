@@ -1,51 +1,240 @@
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
-from io import BytesIO
-import base64
+import numpy as np
 import os
-from datetime import datetime
+import threading
+from crime_categories import CrimeCategories
 from crime_predictor import CrimePredictor
+from crime_store import CrimeDataStore
+from plot_renderer import PlotRenderer, trend_plot_spec
+from plot_store import PlotStore
+
+def normalize_name(name):
+    """Canonical form of a state/district name for exact lookups"""
+    return str(name).strip().lower()
+
+def _finite(value, digits=4):
+    """Round a float for JSON, mapping NaN/inf (no data, division by zero) to None"""
+    return round(float(value), digits) if np.isfinite(value) else None
 
 class CrimeAnalyzer:
     def __init__(self):
-        self.crime_data = pd.read_csv('./data/crime_data.csv')
-        self.states = sorted(self.crime_data['state_ut'].unique())
-        self.crimes = ['murder', 'rape', 'kidnapping_abduction', 'robbery', 'burglary']
+        self.data_path = './data/crime_data.csv'
+        self.store = CrimeDataStore(self.data_path)
+        self._reload_lock = threading.Lock()
         self.output_dir = './output/plots'
         self.predictor = CrimePredictor()
+        # Cached forecasts are only valid for the dataset they were fitted on
+        self.predictor.cache.invalidate_if_changed(self.data_path)
+        self.renderer = PlotRenderer(self.output_dir)
+        self.plot_store = PlotStore(
+            self.output_dir,
+            max_bytes=int(float(os.environ.get('PLOT_STORE_MAX_MB', 200)) * 1024 * 1024),
+            max_age_seconds=int(float(os.environ.get('PLOT_STORE_MAX_AGE_HOURS', 168)) * 3600),
+            sweep_interval=int(os.environ.get('PLOT_STORE_SWEEP_SECONDS', 300)),
+            in_use=self.renderer.in_flight
+        )
+        self.renderer.store = self.plot_store
+        self.plot_store.start()
         os.makedirs(self.output_dir, exist_ok=True)
+        self._snapshot = self._load_data()
 
-    def get_districts(self, state):
-        """Get districts for a given state"""
-        return sorted(self.crime_data[
-            self.crime_data['state_ut'].str.contains(state, case=False)
-        ]['district'].unique())
+    def _load_data(self):
+        """Load the in-memory columns from the current snapshot and index them.
 
-    def get_years(self, state=None, district=None):
-        """Get available years for given state/district"""
-        data = self.crime_data
-        if state:
-            data = data[data['state_ut'].str.contains(state, case=False)]
-        if district:
-            data = data[data['district'].str.contains(district, case=False)]
-        
-        # Convert numpy.int64 to Python int
-        years = sorted(data['year'].unique().tolist())
-        return years
+        Everything derived from one dataset version goes into a new dict that
+        refresh_if_changed swaps in with a single assignment; each request
+        reads self._snapshot once, so it never mixes two versions.
+        """
+        manifest = self.store.manifest()
+        categories = CrimeCategories.load(
+            [name for name, info in manifest['columns'].items() if info['kind'] == 'int'])
+        # Categories analysed when a request names none
+        crimes = categories.default
+        # Categories pre-aggregated per location: the defaults and every group
+        active = categories.resolve(crimes + list(categories.groups))
+        # Columns kept in memory: location, year and the base columns of the
+        # active categories; anything else is read per request
+        columns = ['state_ut', 'district', 'year'] + categories.base_columns(active)
+        crime_data = self.store.load(columns, manifest=manifest)
+        snapshot = {
+            'manifest': manifest,
+            # Identifies the dataset the indexes were built from
+            'version': manifest['source_hash'],
+            'categories': categories,
+            'crimes': crimes,
+            'columns': columns,
+            'crime_data': crime_data,
+            'states': sorted(crime_data['state_ut'].unique()),
+        }
+        snapshot.update(self._build_indexes(crime_data, categories, active))
+        return snapshot
+
+    @property
+    def categories(self):
+        return self._snapshot['categories']
+
+    @property
+    def crimes(self):
+        return self._snapshot['crimes']
+
+    @property
+    def states(self):
+        return self._snapshot['states']
+
+    @property
+    def version(self):
+        return self._snapshot['version']
+
+    @property
+    def crime_data(self):
+        return self._snapshot['crime_data']
+
+    def refresh_if_changed(self):
+        """Re-ingest and re-index when crime_data.csv changed on disk; True if it did"""
+        if not self.store.changed(self.version):
+            return False
+        with self._reload_lock:
+            if not self.store.changed(self.version):
+                return False
+            self._snapshot = self._load_data()
+            self.predictor.cache.invalidate_if_changed(self.data_path)
+            return True
+
+    def _build_indexes(self, data, categories, active):
+        """Normalized location indexes and a (state, district, year) x crime cube.
+
+        Exact lookups are dictionary hits against these; the regex substring
+        scans are only used when a caller opts into fuzzy matching.
+        """
+        state_key = data['state_ut'].map(normalize_name)
+        district_key = data['district'].map(normalize_name)
+
+        # Row positions for each location key
+        location_rows = {(None, None): np.arange(len(data))}
+        for state, rows in pd.Series(np.arange(len(data))).groupby(state_key.values).indices.items():
+            location_rows[(state, None)] = rows
+        for district, rows in pd.Series(np.arange(len(data))).groupby(district_key.values).indices.items():
+            location_rows[(None, district)] = rows
+        for (state, district), rows in data.groupby([state_key, district_key]).indices.items():
+            location_rows[(state, district)] = rows
 
-    def get_prevalent_crimes(self, state=None, district=None):
-        """Get crimes sorted by prevalence for location"""
-        data = self.crime_data
+        districts = {
+            state: sorted(group.unique())
+            for state, group in data['district'].groupby(state_key.values)
+        }
+
+        # Pre-aggregated cube over the in-memory base columns, in one groupby;
+        # per-location totals of every active category are rolled up from it
+        # with a single matrix product per level
+        base = categories.base_columns(active)
+        counts = self._counts(data, base)
+        cube = counts.groupby([state_key.rename('state'), district_key.rename('district'), data['year']]).sum()
+        flat_cube = cube.reset_index()
+        weights = categories.weights(base, active)
+        location_years = {(None, None): sorted(flat_cube['year'].unique().tolist())}
+        location_totals = {(None, None): cube.to_numpy().sum(axis=0) @ weights}
+        for group_levels in (['state'], ['district'], ['state', 'district']):
+            totals = cube.groupby(level=group_levels).sum()
+            years = flat_cube.groupby(group_levels)['year'].unique()
+            for key, row in zip(totals.index, totals.to_numpy() @ weights):
+                location_totals[self._level_key(group_levels, key)] = row
+            for key, group_years in years.items():
+                location_years[self._level_key(group_levels, key)] = sorted(group_years.tolist())
+        return {
+            'rows': location_rows,
+            'districts': districts,
+            'cube': cube,
+            'category_position': {name: i for i, name in enumerate(active)},
+            'years': location_years,
+            'totals': location_totals,
+        }
+
+    def _counts(self, data, columns):
+        """Base crime columns as one int64 frame, missing counts as 0"""
+        return pd.DataFrame(data[columns].to_numpy(dtype=np.int64, na_value=0), index=data.index, columns=columns)
+
+    def category_totals(self, data, categories, by=None, snapshot=None):
+        """Sums of the given categories (columns or groups) over data, optionally per `by`.
+
+        The needed base columns are summed once and mapped onto every
+        requested category with one matrix product.
+        """
+        catalog = (snapshot or self._snapshot)['categories']
+        base = catalog.base_columns(categories)
+        weights = catalog.weights(base, categories)
+        counts = self._counts(data, base)
+        if by is None:
+            return pd.Series(counts.to_numpy().sum(axis=0) @ weights, index=categories)
+        sums = counts.groupby(data[by]).sum()
+        return pd.DataFrame(sums.to_numpy() @ weights, index=sums.index, columns=categories)
+
+    def _level_key(self, group_levels, key):
+        """Map a groupby key onto the (state, district) lookup key"""
+        key = key if isinstance(key, tuple) else (key,)
+        values = dict(zip(group_levels, key))
+        return (values.get('state'), values.get('district'))
+
+    def _location_key(self, state=None, district=None):
+        return (normalize_name(state) if state else None, normalize_name(district) if district else None)
+
+    def _fuzzy_filter(self, data, state=None, district=None):
+        """Case-insensitive substring match on state/district (the opt-in fuzzy path)"""
         if state:
             data = data[data['state_ut'].str.contains(state, case=False)]
         if district:
             data = data[data['district'].str.contains(district, case=False)]
-        
-        totals = data[self.crimes].sum()
-        return sorted([(crime, count) for crime, count in totals.items()], 
+        return data
+
+    def location_rows(self, state=None, district=None, fuzzy=False, snapshot=None):
+        """Row positions for a state/district, by exact normalized name unless fuzzy"""
+        snapshot = snapshot or self._snapshot
+        if fuzzy:
+            # crime_data has a RangeIndex, so labels are row positions
+            return self._fuzzy_filter(snapshot['crime_data'], state, district).index.to_numpy()
+        rows = snapshot['rows'].get(self._location_key(state, district))
+        if rows is None:
+            return np.empty(0, dtype=np.int64)
+        return rows
+
+    def filter_location(self, state=None, district=None, fuzzy=False):
+        """Rows for a state/district, by exact normalized name unless fuzzy"""
+        snapshot = self._snapshot
+        return snapshot['crime_data'].iloc[self.location_rows(state, district, fuzzy, snapshot)]
+
+    def get_districts(self, state, fuzzy=False):
+        """Get districts for a given state"""
+        snapshot = self._snapshot
+        if fuzzy:
+            return sorted(self._fuzzy_filter(snapshot['crime_data'], state)['district'].unique())
+        return list(snapshot['districts'].get(normalize_name(state), []))
+
+    def get_years(self, state=None, district=None, fuzzy=False, snapshot=None):
+        """Get available years for given state/district"""
+        snapshot = snapshot or self._snapshot
+        if fuzzy:
+            data = self._fuzzy_filter(snapshot['crime_data'], state, district)
+            # Convert numpy.int64 to Python int
+            return sorted(data['year'].unique().tolist())
+        return list(snapshot['years'].get(self._location_key(state, district), []))
+
+    def get_prevalent_crimes(self, state=None, district=None, fuzzy=False, crimes=None, snapshot=None):
+        """Get crimes sorted by prevalence for location.
+
+        `crimes` may name any columns or groups (see CrimeCategories);
+        the default categories are used when it is empty.
+        """
+        snapshot = snapshot or self._snapshot
+        categories = snapshot['categories']
+        crimes = categories.resolve(crimes) if crimes else snapshot['crimes']
+        position = snapshot['category_position']
+        if fuzzy or any(crime not in position for crime in crimes):
+            rows = self.location_rows(state, district, fuzzy, snapshot)
+            totals = self.category_totals(self.load_rows(rows, categories.base_columns(crimes), snapshot),
+                                          crimes, snapshot=snapshot)
+        else:
+            row = snapshot['totals'].get(self._location_key(state, district))
+            totals = {crime: row[position[crime]] if row is not None else 0 for crime in crimes}
+        return sorted([(crime, int(count)) for crime, count in totals.items()], 
                      key=lambda x: x[1], reverse=True)
 
     def interactive_analysis(self, params):
@@ -58,8 +247,10 @@ class CrimeAnalyzer:
         if not params.get('state') and not params.get('district'):
             raise ValueError("You must specify either a state or a district.")
 
+        snapshot = self._snapshot
         # Validate years
-        available_years = self.get_years(params.get('state'), params.get('district'))
+        available_years = self.get_years(params.get('state'), params.get('district'), params.get('fuzzy', False),
+                                         snapshot)
         if params.get('years'):
             params['years'] = [year for year in params['years'] if year in available_years]
             if not params['years']:
@@ -68,9 +259,10 @@ class CrimeAnalyzer:
             params['years'] = available_years  # Use all available years if no years are provided
 
         # Validate crimes
-        prevalent_crimes = self.get_prevalent_crimes(params.get('state'), params.get('district'))
+        prevalent_crimes = self.get_prevalent_crimes(params.get('state'), params.get('district'), params.get('fuzzy', False),
+                                                     snapshot=snapshot)
         if params.get('crimes'):
-            params['crimes'] = [crime for crime in params['crimes'] if crime in [c[0] for c in prevalent_crimes]]
+            params['crimes'] = snapshot['categories'].resolve(params['crimes'])
             if not params['crimes']:
                 params['crimes'] = [crime[0] for crime in prevalent_crimes]  # Use all crimes if no valid crimes are provided
         else:
@@ -82,62 +274,193 @@ class CrimeAnalyzer:
                 raise ValueError("Prediction years must be between 1 and 100.")
 
         # Generate analysis
-        return self.generate_analysis(params)
+        return self.generate_analysis(params, snapshot=snapshot)
 
-    def generate_analysis(self, params):
-        """Generate analysis and predictions based on selected parameters"""
-        filtered_data = self.crime_data.copy()
-        
-        if params['state']:
-            filtered_data = filtered_data[
-                filtered_data['state_ut'].str.contains(params['state'], case=False)
-            ]
-        if params['district']:
-            filtered_data = filtered_data[
-                filtered_data['district'].str.contains(params['district'], case=False)
-            ]
-        if params['years']:
-            filtered_data = filtered_data[filtered_data['year'].isin(params['years'])]
-        
-        crimes_to_analyze = params['crimes'] if params['crimes'] else self.crimes
+    def filter_rows(self, params, columns=None, snapshot=None):
+        """Raw rows matching the location and year filters in params.
+
+        Only the requested columns (every dataset column by default) are
+        read from the snapshot, and only for the matching rows.
+        """
+        snapshot = snapshot or self._snapshot
+        rows = self.location_rows(params.get('state'), params.get('district'), params.get('fuzzy', False), snapshot)
+        if params.get('years'):
+            rows = rows[np.isin(snapshot['crime_data']['year'].to_numpy()[rows], params['years'])]
+        return self.load_rows(rows, columns, snapshot)
+
+    def load_rows(self, rows, columns=None, snapshot=None):
+        """Given columns (all by default) at the given row positions, from memory when loaded"""
+        snapshot = snapshot or self._snapshot
+        if columns is not None and set(columns) <= set(snapshot['columns']):
+            return snapshot['crime_data'].iloc[rows][list(columns)]
+        return self.store.load(columns, rows=rows, manifest=snapshot['manifest'])
+
+    def compare_labels(self, locations):
+        """Display label of every location to compare; ValueError if one is listed twice"""
+        labels = [loc.get('label') or ' / '.join(str(loc[key]) for key in ('state', 'district') if loc.get(key))
+                  for loc in locations]
+        seen_keys, seen_labels = set(), set()
+        for loc, label in zip(locations, labels):
+            key = self._location_key(loc.get('state'), loc.get('district'))
+            if key in seen_keys or label in seen_labels:
+                raise ValueError(f"Location '{label}' is listed more than once.")
+            seen_keys.add(key)
+            seen_labels.add(label)
+        return labels
+
+    def compare(self, locations, crimes=None, years=None, fuzzy=False, predict_years=0, engine=None,
+                on_forecast=None, is_cancelled=None):
+        """Side-by-side totals, year-over-year growth and rankings for many locations.
+
+        `locations` is a list of {'state', 'district', 'label', 'population'}
+        dicts (population optional); a location or label given twice raises
+        ValueError. All locations are aggregated in a single groupby over
+        (location, year); with predict_years, every (location, crime) series
+        is forecast in one batch on `engine`. Forecasts are keyed by
+        (position in `locations`, crime) and passed to on_forecast(key,
+        forecast) as they complete.
+        """
+        snapshot = self._snapshot
+        categories = snapshot['categories']
+        crimes = categories.resolve(crimes or []) or snapshot['crimes']
+        base = categories.base_columns(crimes)
+        weights = categories.weights(base, crimes)
+        labels = self.compare_labels(locations)
+
+        # Tag every matching row with its location; overlapping locations
+        # (a state and one of its districts) simply contribute rows to both
+        location_rows = [self.location_rows(loc.get('state'), loc.get('district'), fuzzy, snapshot) for loc in locations]
+        rows = np.concatenate(location_rows) if location_rows else np.empty(0, dtype=np.int64)
+        owner = np.repeat(np.arange(len(locations)), [len(r) for r in location_rows])
+        row_years = snapshot['crime_data']['year'].to_numpy()[rows]
+        if years:
+            keep = np.isin(row_years, years)
+            rows, owner, row_years = rows[keep], owner[keep], row_years[keep]
+
+        counts = self._counts(self.load_rows(rows, base, snapshot), base)
+        sums = counts.groupby([owner, row_years]).sum()
+        all_years = sorted(set(row_years.tolist()))
+
+        # (location, year, crime) cube; NaN marks years a location has no rows for
+        cube = np.full((len(locations), len(all_years), len(crimes)), np.nan)
+        if len(sums):
+            location_idx = sums.index.get_level_values(0).to_numpy()
+            year_idx = np.searchsorted(all_years, sums.index.get_level_values(1).to_numpy())
+            cube[location_idx, year_idx] = sums.to_numpy() @ weights
+        present = ~np.isnan(cube[:, :, 0]) if crimes else np.zeros((len(locations), len(all_years)), dtype=bool)
+
+        totals = np.nansum(cube, axis=1)
+        years_covered = present.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = (cube[:, 1:] - cube[:, :-1]) / cube[:, :-1]
+            annual_mean = totals / years_covered[:, None]
+        growth[~np.isfinite(growth)] = np.nan
+
+        populations = np.array([float(loc.get('population') or np.nan) for loc in locations])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            per_100k = annual_mean / populations[:, None] * 100000
+
+        results = []
+        for i, label in enumerate(labels):
+            results.append({
+                'label': label,
+                'state': locations[i].get('state'),
+                'district': locations[i].get('district'),
+                'total_records': int(np.count_nonzero(owner == i)),
+                'years': [year for year, has in zip(all_years, present[i]) if has],
+                'totals': {crime: int(totals[i, j]) for j, crime in enumerate(crimes)},
+                'annual_mean': {crime: _finite(annual_mean[i, j]) for j, crime in enumerate(crimes)},
+                'per_100k': ({crime: _finite(per_100k[i, j]) for j, crime in enumerate(crimes)}
+                             if np.isfinite(populations[i]) else None),
+                'yearly': {crime: {int(year): int(cube[i, y, j]) for y, year in enumerate(all_years) if present[i, y]}
+                           for j, crime in enumerate(crimes)},
+                'yoy_growth': {crime: {int(all_years[y + 1]): _finite(growth[i, y, j])
+                                       for y in range(len(all_years) - 1) if present[i, y + 1] and present[i, y]}
+                               for j, crime in enumerate(crimes)},
+            })
+
+        # Highest first; locations without data are left out of the rankings
+        has_data = years_covered > 0
+        rankings = {}
+        for j, crime in enumerate(crimes):
+            order = [i for i in np.argsort(-totals[:, j], kind='stable') if has_data[i]]
+            rankings[crime] = {'by_total': [labels[i] for i in order]}
+            if np.isfinite(populations[has_data]).all() and has_data.any():
+                order = [i for i in np.argsort(-per_100k[:, j], kind='stable') if has_data[i]]
+                rankings[crime]['by_per_100k'] = [labels[i] for i in order]
+
+        forecasts = {}
+        if predict_years > 0:
+            series = {}
+            for i in range(len(locations)):
+                for j, crime in enumerate(crimes):
+                    if present[i].sum() >= 2:
+                        series[(i, crime)] = pd.DataFrame({
+                            'ds': pd.to_datetime([str(year) for year in np.array(all_years)[present[i]]]),
+                            'y': cube[i, present[i], j],
+                        })
+            forecasts = self.predictor.forecast_series(
+                series, predict_years, params={'compare': True, 'years': years}, engine=engine,
+                on_result=on_forecast, is_cancelled=is_cancelled
+            )
+
+        return {
+            'crimes': crimes,
+            'years': all_years,
+            'locations': results,
+            'rankings': rankings,
+            'forecasts': forecasts,
+        }
+
+    def generate_analysis(self, params, on_prediction=None, is_cancelled=None, snapshot=None):
+        """Generate analysis and predictions based on selected parameters
+
+        on_prediction(crime, result) is called as each forecast completes and
+        is_cancelled() is polled between forecasts so long runs can stop early.
+        """
+        snapshot = snapshot or self._snapshot
+        categories = snapshot['categories']
+        crimes_to_analyze = categories.resolve(params.get('crimes') or []) or snapshot['crimes']
+        filtered_data = self.filter_rows(params, ['year'] + categories.base_columns(crimes_to_analyze), snapshot)
         
         if filtered_data.empty:
             return "No data found for the specified criteria"
 
-        # Create visualization with predictions if requested
-        plt.figure(figsize=(12, 6))
-        
-        # Plot historical data
-        data_to_plot = filtered_data.groupby('year')[crimes_to_analyze].sum()
-        data_to_plot.plot(kind='line', marker='o')
+        # One aggregation pass over the needed base columns gives every
+        # requested category per year; it feeds the forecasts, the plot and
+        # the summary totals, and the raw rows are not carried any further
+        yearly = self.category_totals(filtered_data, crimes_to_analyze, by='year', snapshot=snapshot)
 
-        # Add predictions if requested
+        # Add predictions if requested, fitting every crime in parallel
         predictions = {}
         if params['predict_years'] > 0:
-            for crime in crimes_to_analyze:
-                try:
-                    pred_result = self.predictor.train_and_predict(
-                        filtered_data, 
-                        crime, 
-                        future_years=params['predict_years']
-                    )
-                    predictions[crime] = pred_result
-                    
-                    # Plot prediction line
-                    forecast = pred_result['forecast']
-                    plt.plot(forecast['ds'].dt.year, forecast['yhat'], 
-                            '--', label=f'{crime} (predicted)')
-                    
-                    # Plot confidence intervals
-                    plt.fill_between(
-                        forecast['ds'].dt.year,
-                        forecast['yhat_lower'],
-                        forecast['yhat_upper'],
-                        alpha=0.2
-                    )
-                except Exception as e:
-                    print(f"Warning: Could not generate prediction for {crime}: {str(e)}")
-        
+            predictions = self.predictor.train_and_predict_many(
+                yearly.reset_index(),
+                crimes_to_analyze,
+                future_years=params['predict_years'],
+                on_result=on_prediction,
+                is_cancelled=is_cancelled,
+                params={key: params.get(key) for key in ('state', 'district', 'years')},
+                engine=params.get('engine')
+            )
+
+        plot = self.renderer.render(
+            trend_plot_spec(self._plot_title(params), yearly[crimes_to_analyze],
+                            {crime: pred['forecast'] for crime, pred in predictions.items()})
+        )
+
+        return {
+            'total_records': len(filtered_data),
+            'yearly': yearly,
+            'totals': yearly.sum(),
+            'plot_url': plot['plot_url'],
+            'plot_path': plot['plot_path'],
+            'parameters': params,
+            'years_analyzed': yearly.index.tolist(),
+            'predictions': predictions
+        }
+
+    def _plot_title(self, params):
         # Create title
         title = 'Crime Trends'
         if params['state']:
@@ -146,34 +469,4 @@ class CrimeAnalyzer:
             title += f" - {params['district']}"
         if params['predict_years'] > 0:
             title += f"\n(with {params['predict_years']}-year prediction)"
-
-        plt.title(title)
-        plt.xlabel('Year')
-        plt.ylabel('Number of Cases')
-        plt.xticks(rotation=45)
-        plt.grid(True, linestyle='--', alpha=0.7)
-        plt.legend()
-        plt.tight_layout()
-
-        # Save plot
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"crime_analysis_{timestamp}.png"
-        filepath = os.path.join(self.output_dir, filename)
-        plt.savefig(filepath)
-        
-        # Save to buffer for web display
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        image_png = buffer.getvalue()
-        buffer.close()
-        plt.close()
-
-        return {
-            'data': filtered_data.to_dict('records'),
-            'plot': base64.b64encode(image_png).decode('utf-8'),
-            'plot_path': filepath,
-            'parameters': params,
-            'years_analyzed': sorted(filtered_data['year'].unique()),
-            'predictions': predictions
-        }
\ No newline at end of file
+        return title
@@ -0,0 +1,74 @@
+import json
+import os
+import numpy as np
+
+# Crime categories for analysis: every count column of crime_data.csv plus
+# named groups rolled up from them ("violent", "property", ...). The default
+# set, excluded columns and groups are read from crime_categories.json.
+CATEGORIES_PATH = os.environ.get('CRIME_CATEGORIES_PATH', './data/crime_categories.json')
+# Columns that describe a row rather than count crimes
+NON_CRIME_COLUMNS = ['state_ut', 'district', 'district_ut', 'year']
+
+
+class CrimeCategories:
+    """Base crime columns and groups, aggregated with one matrix product.
+
+    Every category is a 0/1 weight vector over the base columns, so totals
+    for any set of categories are `counts @ weights(...)`, where `counts`
+    holds per-row (or per-group) sums of the base columns.
+    """
+
+    def __init__(self, columns, default=None, groups=None):
+        self.columns = list(columns)
+        known = set(self.columns)
+        self.groups = {}
+        for name, members in (groups or {}).items():
+            if name in known:
+                print(f"Warning: crime group '{name}' shadows a column and is ignored")
+                continue
+            members = [member for member in members if member in known]
+            if members:
+                self.groups[name] = members
+        self.names = self.columns + list(self.groups)
+        self.default = [name for name in (default or []) if name in self] or self.columns[:5]
+
+    @classmethod
+    def load(cls, dataset_columns, path=CATEGORIES_PATH):
+        """Categories for the given count columns, configured from `path` if it exists"""
+        config = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                config = json.load(f)
+        excluded = set(NON_CRIME_COLUMNS) | set(config.get('exclude', []))
+        columns = [column for column in dataset_columns if column not in excluded]
+        return cls(columns, config.get('default'), config.get('groups'))
+
+    def __contains__(self, name):
+        return name in self.groups or name in self.columns
+
+    def resolve(self, names):
+        """Known categories from a list, in order and without duplicates; 'all' expands to every column"""
+        resolved = []
+        for name in names:
+            resolved.extend(self.columns if name == 'all' else [name])
+        return [name for name in dict.fromkeys(resolved) if name in self]
+
+    def members(self, name):
+        return self.groups.get(name, [name])
+
+    def base_columns(self, categories):
+        """Base columns needed to compute the given categories"""
+        needed = {member for name in categories for member in self.members(name)}
+        return [column for column in self.columns if column in needed]
+
+    def weights(self, base, categories):
+        """(len(base), len(categories)) 0/1 matrix mapping base sums to category sums"""
+        position = {column: i for i, column in enumerate(base)}
+        matrix = np.zeros((len(base), len(categories)), dtype=np.int64)
+        for j, name in enumerate(categories):
+            for member in self.members(name):
+                matrix[position[member], j] = 1
+        return matrix
+
+    def to_dict(self):
+        return {'columns': self.columns, 'groups': self.groups, 'default': self.default}
@@ -1,16 +1,235 @@
-from prophet import Prophet
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
+from abc import ABC, abstractmethod
 from datetime import datetime
+import multiprocessing
 import numpy as np
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from forecast_cache import ForecastCache, make_key, series_hash
+
+def future_dates(future_years, start=None):
+    """Year-end dates to forecast, starting from the current year"""
+    return pd.DataFrame({
+        'ds': pd.date_range(
+            start=start or datetime.today(),     # Start from current datetime
+            periods=future_years,
+            freq='YE'                   # Year-end frequency
+            )
+            })
+
+
+def fit_forecast(train_data, future_years, start=None):
+    """Fit Prophet on one prepared series and forecast future_years ahead.
+
+    Module-level and free of shared state so it can run in a worker process.
+    """
+    # Imported here: Prophet is slow to import and only this engine needs it
+    from prophet import Prophet
+    model = Prophet(
+        yearly_seasonality=True,
+        weekly_seasonality=False,
+        daily_seasonality=False,
+        uncertainty_samples=1000
+    )
+    model.fit(train_data)
+    
+    # Make predictions
+    return model.predict(future_dates(future_years, start))
+
+
+class ForecastEngine(ABC):
+    """Interface for forecasting backends.
+
+    forecast_many takes {key: train_data} (prepared 'ds'/'y' frames) and yields
+    (key, forecast) pairs, where forecast has 'ds', 'yhat', 'yhat_lower' and
+    'yhat_upper' columns, or (key, exception) when a series cannot be fitted.
+    """
+    name = None
+
+    @property
+    def cache_tag(self):
+        """Identifies the engine and its settings in forecast cache keys"""
+        return self.name
+
+    @abstractmethod
+    def forecast_many(self, series, future_years, start, is_cancelled=None):
+        """Yield (key, forecast or exception) for every series, stopping early if is_cancelled()"""
+
+    def close(self):
+        pass
+
+
+def default_forecast_workers():
+    """Forecast processes per web worker: the cores split between WEB_CONCURRENCY workers"""
+    web_workers = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+    return max(1, (os.cpu_count() or 1) // web_workers)
+
+
+class ProphetEngine(ForecastEngine):
+    """One Prophet fit per series, spread over a process pool"""
+    name = 'prophet'
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or int(os.environ.get('FORECAST_WORKERS', 0)) or default_forecast_workers()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # Fork a clean server process rather than the web worker, whose
+                # torch threads and locks would be copied mid-use into the children
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context('forkserver'))
+            return self._pool
+
+    def forecast_many(self, series, future_years, start, is_cancelled=None):
+        if len(series) > 1 and self.max_workers > 1:
+            pool = self._get_pool()
+            futures = {
+                pool.submit(fit_forecast, train_data, future_years, start): key
+                for key, train_data in series.items()
+            }
+            completed = ((futures[future], future.result) for future in as_completed(futures))
+        else:
+            futures = {}
+            completed = (
+                (key, partial(fit_forecast, train_data, future_years, start))
+                for key, train_data in series.items()
+            )
+
+        for key, get_forecast in completed:
+            if is_cancelled and is_cancelled():
+                for pending in futures:
+                    pending.cancel()
+                return
+            try:
+                yield key, get_forecast()
+            except Exception as e:
+                yield key, e
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+
+class NumpyTrendEngine(ForecastEngine):
+    """Damped linear trend fitted to every series at once by least squares.
+
+    Series are stacked into a (series x year) matrix, with NaN where a series
+    has no value for a year, and fitted in one vectorized pass. Intervals are
+    the analytic OLS prediction intervals at Prophet's default 80% width.
+    """
+    name = 'numpy'
+    Z_80 = 1.2815515655446004
+
+    def __init__(self, damping=None):
+        # damping = 1.0 is an undamped linear trend
+        self.damping = damping if damping is not None else float(os.environ.get('FORECAST_DAMPING', 1.0))
+
+    @property
+    def cache_tag(self):
+        return f"{self.name}-damping{self.damping}"
+
+    @staticmethod
+    def _decimal_years(dates):
+        dates = pd.DatetimeIndex(dates)
+        return (dates.year + (dates.dayofyear - 1) / 365.25).to_numpy(dtype=float)
+
+    def forecast_many(self, series, future_years, start, is_cancelled=None):
+        if not series:
+            return
+        keys = list(series)
+        years = sorted({t for train_data in series.values() for t in self._decimal_years(train_data['ds'])})
+        column = {t: i for i, t in enumerate(years)}
+        t = np.asarray(years)
+
+        # (n_series, n_years) observations, NaN where a series has no data
+        y = np.full((len(keys), len(years)), np.nan)
+        for row, key in enumerate(keys):
+            train_data = series[key]
+            cols = [column[v] for v in self._decimal_years(train_data['ds'])]
+            y[row, cols] = train_data['y'].to_numpy(dtype=float)
+
+        mask = ~np.isnan(y)
+        n = mask.sum(axis=1)
+        y0 = np.where(mask, y, 0.0)
+        t_mean = (mask * t).sum(axis=1) / np.maximum(n, 1)
+        y_mean = y0.sum(axis=1) / np.maximum(n, 1)
+        dt = np.where(mask, t - t_mean[:, None], 0.0)
+        sxx = (dt ** 2).sum(axis=1)
+        slope = np.divide((dt * (y0 - y_mean[:, None])).sum(axis=1), sxx,
+                          out=np.zeros(len(keys)), where=sxx > 0)
+        intercept = y_mean - slope * t_mean
+
+        residuals = np.where(mask, y0 - (intercept[:, None] + slope[:, None] * t), 0.0)
+        dof = np.maximum(n - 2, 1)
+        sigma = np.sqrt((residuals ** 2).sum(axis=1) / dof)
+
+        dates = future_dates(future_years, start)
+        t_future = self._decimal_years(dates['ds'])
+        t_last = np.array([t[mask[row]].max() if n[row] else t_mean[row] for row in range(len(keys))])
+        steps = t_future[None, :] - t_last[:, None]
+        if self.damping == 1.0:
+            trend_steps = steps
+        else:
+            # Damped trend: the slope's contribution decays by `damping` per year
+            phi = self.damping
+            trend_steps = phi * (1 - phi ** steps) / (1 - phi)
+        level = intercept + slope * t_last
+        yhat = level[:, None] + slope[:, None] * trend_steps
+
+        # OLS prediction interval, evaluated at the (damped) effective horizon
+        t_effective = t_last[:, None] + trend_steps
+        spread = np.sqrt(1 + 1 / np.maximum(n, 1)[:, None]
+                         + np.divide((t_effective - t_mean[:, None]) ** 2, sxx[:, None],
+                                     out=np.zeros_like(t_effective), where=sxx[:, None] > 0))
+        margin = self.Z_80 * sigma[:, None] * spread
+
+        for row, key in enumerate(keys):
+            if n[row] < 2:
+                yield key, ValueError("At least two data points are needed to fit a trend")
+                continue
+            forecast = dates.copy()
+            forecast['yhat'] = yhat[row]
+            forecast['yhat_lower'] = yhat[row] - margin[row]
+            forecast['yhat_upper'] = yhat[row] + margin[row]
+            yield key, forecast
+
+
+ENGINES = {
+    ProphetEngine.name: ProphetEngine,
+    NumpyTrendEngine.name: NumpyTrendEngine,
+}
+DEFAULT_ENGINE = os.environ.get('FORECAST_ENGINE', ProphetEngine.name)
+
 
 class CrimePredictor:
-    def __init__(self):
-        self.model = None
+    def __init__(self, max_workers=None, cache=None):
         self.last_training_params = None
+        self.cache = cache or ForecastCache(
+            max_entries=int(os.environ.get('FORECAST_CACHE_SIZE', 256)),
+            max_disk_entries=int(os.environ.get('FORECAST_CACHE_DISK_SIZE', 4096))
+        )
+        # Worker processes for the Prophet engine (defaults to the CPU count)
+        self.max_workers = max_workers
+        self._engines = {}
+        self._engines_lock = threading.Lock()
+
+    def get_engine(self, name=None):
+        """Shared instance of a forecasting engine, by name"""
+        name = name or DEFAULT_ENGINE
+        if name not in ENGINES:
+            raise ValueError(f"Unknown forecasting engine '{name}'. Choose from: {', '.join(ENGINES)}")
+        with self._engines_lock:
+            if name not in self._engines:
+                if name == ProphetEngine.name:
+                    self._engines[name] = ProphetEngine(self.max_workers)
+                else:
+                    self._engines[name] = ENGINES[name]()
+            return self._engines[name]
 
     def prepare_data(self, data, crime_type):
         """Prepare data for Prophet model"""
@@ -22,45 +241,82 @@ class CrimePredictor:
         yearly_data['ds'] = pd.to_datetime(yearly_data['ds'].astype(str))
         return yearly_data
 
-    def train_and_predict(self, historical_data, crime_type, future_years=100):
+    def _cache_key(self, params, crime_type, future_years, train_data, start, engine):
+        return make_key(params, crime_type, future_years, start.year, series_hash(train_data), engine.cache_tag)
+
+    def train_and_predict(self, historical_data, crime_type, future_years=100, params=None, engine=None):
         """Train model and make predictions"""
-        # Prepare training data
-        train_data = self.prepare_data(historical_data, crime_type)
-        
-        # Initialize and train Prophet model
-        self.model = Prophet(
-            yearly_seasonality=True,
-            weekly_seasonality=False,
-            daily_seasonality=False,
-            uncertainty_samples=1000
-        )
-        self.model.fit(train_data)
-        
-        # Create future dates dataframe
-        last_year = train_data['ds'].dt.year.max()
-        future_dates = pd.DataFrame({
-            'ds': pd.date_range(
-                start=datetime.today(),     # Start from current datetime
-                periods=future_years,
-                freq='YE'                   # Year-end frequency
-                )
-                })
-        
-        # Make predictions
-        forecast = self.model.predict(future_dates)
-        
-        return {
-            'forecast': forecast,
-            'historical': train_data,
-            'crime_type': crime_type
-        }
+        results = self.train_and_predict_many(historical_data, [crime_type], future_years,
+                                              params=params, engine=engine)
+        if crime_type not in results:
+            raise ValueError(f"Could not generate prediction for {crime_type}")
+        return results[crime_type]
+
+    def forecast_series(self, series, future_years=100, params=None, engine=None,
+                        on_result=None, is_cancelled=None):
+        """Forecast prepared series {key: train_data}; returns {key: forecast}.
+
+        Cached forecasts are reused and only misses go to the engine. Keys may
+        be anything hashable; str(key) is part of the cache key.
+        """
+        engine = self.get_engine(engine)
+        # Every series shares one start date so the forecasts line up
+        start = datetime.today()
+
+        forecasts = {}
+        cache_keys = {}
+        misses = {}
+        for key, train_data in series.items():
+            cache_keys[key] = self._cache_key(params, str(key), future_years, train_data, start, engine)
+            forecast = self.cache.get(cache_keys[key])
+            if forecast is None:
+                misses[key] = train_data
+                continue
+            forecasts[key] = forecast
+            if on_result:
+                on_result(key, forecast)
+
+        for key, forecast in engine.forecast_many(misses, future_years, start, is_cancelled):
+            if isinstance(forecast, Exception):
+                print(f"Warning: Could not generate prediction for {key}: {str(forecast)}")
+                continue
+            self.cache.put(cache_keys[key], forecast)
+            forecasts[key] = forecast
+            if on_result:
+                on_result(key, forecast)
+
+        return forecasts
+
+    def train_and_predict_many(self, historical_data, crimes, future_years=100,
+                               on_result=None, is_cancelled=None, params=None, engine=None):
+        """Forecast every crime in one batch on the selected engine.
+
+        Returns {crime: result} with the same structure as train_and_predict.
+        Cached forecasts are reused; crimes whose fit fails are left out with
+        a warning. on_result(crime, result) is called as each forecast becomes
+        available; is_cancelled() is polled in between and drops the
+        remaining fits when it returns True.
+        """
+        series = {crime: self.prepare_data(historical_data, crime) for crime in crimes}
+
+        def wrap(crime, forecast):
+            return {'forecast': forecast, 'historical': series[crime], 'crime_type': crime}
+
+        publish = (lambda crime, forecast: on_result(crime, wrap(crime, forecast))) if on_result else None
+        forecasts = self.forecast_series(series, future_years, params, engine, publish, is_cancelled)
+
+        # Keep the caller's crime order regardless of completion order
+        return {crime: wrap(crime, forecasts[crime]) for crime in crimes if crime in forecasts}
 
     def plot_prediction(self, prediction_data, title_prefix=""):
         """Create visualization of predictions with confidence intervals"""
         forecast = prediction_data['forecast']
         historical = prediction_data['historical']
         crime_type = prediction_data['crime_type']
-        
+
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(12, 6))
         
         # Plot historical data
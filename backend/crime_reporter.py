@@ -1,14 +1,33 @@
-import pandas as pd
+import atexit
+import os
 import json
 from datetime import datetime
-import geocoder
-from location import get_location
+from location import LocationResolver
+from report_sink import BACKENDS, ReportSink
 
 class CrimeReporter:
-    def __init__(self):
-        self.report_file = './data/reported_crimes.csv'
+    def __init__(self, backend=None, durable=None):
+        # Storage backend for reports: 'csv' (default), 'jsonl' or 'sqlite'
+        backend = backend or os.environ.get('REPORT_BACKEND', 'csv')
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown report backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+        if durable is None:
+            durable = os.environ.get('REPORT_DURABLE') == '1'
+        self.sink = ReportSink(
+            BACKENDS[backend](),
+            max_batch=int(os.environ.get('REPORT_BATCH_SIZE', 50)),
+            max_delay=float(os.environ.get('REPORT_FLUSH_SECONDS', 1.0)),
+            durable=durable
+        )
+        self.report_file = getattr(self.sink.backend, 'path', None)
+        self.locator = LocationResolver(timeout=float(os.environ.get('GEOLOCATION_TIMEOUT', 1.0)))
+        atexit.register(self.sink.close)
         self.load_attack_types()
 
+    def stored_reports(self):
+        """All reports written so far, read back from the storage backend"""
+        return self.sink.backend.read_all()
+
     def load_attack_types(self):
         # Load attack types from your data
         self.attack_types = [
@@ -18,12 +37,8 @@ class CrimeReporter:
 
     def report_crime(self, data):
         current_date = datetime.now()
-        try:
-            lat, lon, location = get_location()
-        except Exception as e:
-            print("Could not get location automatically. Please provide city name:")
-            location = data.get('location', 'Unknown')  # Use location from data if automatic detection fails
-            lat, lon = None, None
+        # Client coordinates, cached IP geolocation, or the city name from data
+        lat, lon, location = self.locator.resolve(data)
 
         summary = data.get('crime', 'No description provided')  # Get summary from data
 
@@ -40,7 +55,7 @@ class CrimeReporter:
             'attacktype': attack_type
         }
 
-        df = pd.DataFrame([report])
-        df.to_csv(self.report_file, mode='a', header=False, index=False)
+        # Written in batches by the sink's writer thread
+        self.sink.submit(report)
 
         return report
\ No newline at end of file
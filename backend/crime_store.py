@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from file_lock import file_lock
+
+# Typed columnar snapshot of crime_data.csv: one .npy file per column plus a
+# JSON manifest. Text columns are stored as categorical codes, whole-number
+# columns in the narrowest signed integer type (with a null mask where the
+# CSV has gaps). Columns are memory-mapped on load and each stays its own
+# array in the DataFrame, so forked workers share the pages and only the
+# columns a caller asks for are ever read. Plain .npy files are used rather
+# than Arrow/Parquet because every column kind here (categorical codes,
+# masked ints) maps to pandas without a conversion copy.
+#
+# Each snapshot lives in its own directory named after the CSV hash;
+# manifest.json names the current one and is replaced atomically, so
+# readers switch over in one step and never see a half-written snapshot.
+SOURCE_PATH = './data/crime_data.csv'
+SNAPSHOT_DIR = './data/index/crime_data'
+MANIFEST_FILE = 'manifest.json'
+LOCK_FILE = '.ingest.lock'
+# Snapshot directories kept on disk: the current one and the one before, for
+# workers that have not switched over yet
+KEEP_SNAPSHOTS = 2
+# The CSV's saved pandas index, not data
+DROPPED_COLUMNS = ['Unnamed: 0']
+INT_TYPES = [np.int8, np.int16, np.int32, np.int64]
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _narrow_int(values):
+    """Smallest signed integer dtype that holds every value"""
+    low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for dtype in INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return np.int64
+
+
+def _encode_column(series):
+    """Split one CSV column into arrays to save and its manifest entry"""
+    if series.dtype.kind in 'iuf':
+        if (series.dropna() % 1 == 0).all():
+            mask = series.isna().to_numpy()
+            values = series.fillna(0).to_numpy()
+            arrays = {'values': values.astype(_narrow_int(values))}
+            if mask.any():
+                arrays['mask'] = mask
+            return arrays, {'kind': 'int'}
+        return {'values': series.to_numpy(dtype=np.float64)}, {'kind': 'float'}
+
+    categorical = pd.Categorical(series.astype('string').to_numpy(dtype=object, na_value=None))
+    codes = categorical.codes
+    return ({'values': codes.astype(_narrow_int(codes))},
+            {'kind': 'category', 'categories': [str(c) for c in categorical.categories]})
+
+
+class CrimeDataStore:
+    """Reads crime data columns from the snapshot, re-ingesting the CSV when it changes.
+
+    Ingest runs at most once per CSV version across every process sharing
+    `snapshot_dir`: it holds an exclusive file lock, and whoever gets the
+    lock second finds the new manifest already in place.
+    """
+
+    def __init__(self, source_path=SOURCE_PATH, snapshot_dir=SNAPSHOT_DIR):
+        self.source_path = source_path
+        self.snapshot_dir = snapshot_dir
+        self._manifest = None
+
+    def _manifest_path(self):
+        return os.path.join(self.snapshot_dir, MANIFEST_FILE)
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path(), 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Snapshots from before per-version directories are re-ingested
+        return manifest if 'directory' in manifest else None
+
+    def _write_manifest(self, manifest):
+        tmp_path = f"{self._manifest_path()}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _source_stat(self):
+        stat = os.stat(self.source_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _ingest_lock(self):
+        return file_lock(os.path.join(self.snapshot_dir, LOCK_FILE))
+
+    def ingest(self):
+        """Convert the CSV into a new snapshot, make it current and return its manifest"""
+        with self._ingest_lock():
+            manifest = self._ingest(file_hash(self.source_path))
+            self._manifest = manifest
+            return manifest
+
+    def _ingest(self, digest):
+        # Callers hold _ingest_lock()
+        size, mtime_ns = self._source_stat()
+        data = pd.read_csv(self.source_path, low_memory=False)
+        data = data.drop(columns=[c for c in DROPPED_COLUMNS if c in data.columns])
+
+        directory = digest[:12]
+        target = os.path.join(self.snapshot_dir, directory)
+        tmp_dir = f"{target}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        columns = {}
+        for name in data.columns:
+            arrays, info = _encode_column(data[name])
+            for part, values in arrays.items():
+                file_name = f"{name}.{part}.npy"
+                np.save(os.path.join(tmp_dir, file_name), values)
+                info[part] = file_name
+            info['dtype'] = str(arrays['values'].dtype)
+            columns[name] = info
+        # An existing directory for this hash holds the same data and may be mapped
+        if os.path.isdir(target):
+            shutil.rmtree(tmp_dir)
+        else:
+            os.rename(tmp_dir, target)
+
+        manifest = {
+            'source_hash': digest,
+            'source_size': size,
+            'source_mtime_ns': mtime_ns,
+            'directory': directory,
+            'rows': len(data),
+            'columns': columns,
+        }
+        self._write_manifest(manifest)
+        self._prune(directory)
+        return manifest
+
+    def _prune(self, current):
+        """Remove all but the newest KEEP_SNAPSHOTS snapshot directories.
+
+        Files a worker already has memory-mapped stay readable after removal.
+        """
+        entries = [entry for entry in os.scandir(self.snapshot_dir)
+                   if entry.name not in (MANIFEST_FILE, LOCK_FILE, current)]
+        snapshots = sorted((entry for entry in entries if entry.is_dir() and '.' not in entry.name),
+                           key=lambda entry: entry.stat().st_mtime, reverse=True)
+        keep = {entry.name for entry in snapshots[:KEEP_SNAPSHOTS - 1]}
+        for entry in entries:
+            if entry.name in keep:
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+
+    def manifest(self):
+        """Manifest of a snapshot matching the current CSV, ingesting it if needed"""
+        size, mtime_ns = self._source_stat()
+        manifest = self._manifest
+        if manifest is not None and (manifest['source_size'], manifest['source_mtime_ns']) == (size, mtime_ns):
+            return manifest
+        with self._ingest_lock():
+            # Another worker may have ingested while this one waited for the lock
+            manifest = self._read_manifest()
+            if manifest is None or (manifest['source_size'], manifest['source_mtime_ns']) != (size, mtime_ns):
+                # A touched but unchanged file does not need a new snapshot
+                digest = file_hash(self.source_path)
+                if manifest is None or manifest['source_hash'] != digest:
+                    print("Crime data snapshot missing or stale, ingesting CSV...")
+                    manifest = self._ingest(digest)
+                else:
+                    manifest = dict(manifest, source_size=size, source_mtime_ns=mtime_ns)
+                    self._write_manifest(manifest)
+            self._manifest = manifest
+            return manifest
+
+    def changed(self, version):
+        """Whether the CSV no longer matches the given snapshot version"""
+        return self.manifest()['source_hash'] != version
+
+    def columns(self):
+        return list(self.manifest()['columns'])
+
+    def _load_array(self, manifest, file_name):
+        return np.load(os.path.join(self.snapshot_dir, manifest['directory'], file_name), mmap_mode='r')
+
+    def load(self, columns=None, rows=None, manifest=None):
+        """DataFrame of the given columns (all by default), optionally only some row positions"""
+        manifest = manifest or self.manifest()
+        names = [name for name in (columns or manifest['columns']) if name in manifest['columns']]
+        frame = {}
+        for name in names:
+            info = manifest['columns'][name]
+            values = self._load_array(manifest, info['values'])
+            if rows is not None:
+                values = values[rows]
+            if info['kind'] == 'category':
+                frame[name] = pd.Categorical.from_codes(values, categories=info['categories'])
+            elif 'mask' in info:
+                mask = self._load_array(manifest, info['mask'])
+                if rows is not None:
+                    mask = mask[rows]
+                frame[name] = pd.arrays.IntegerArray(np.asarray(values), np.asarray(mask))
+            else:
+                frame[name] = values
+        index = pd.RangeIndex(manifest['rows']) if rows is None else pd.Index(rows)
+        # copy=False keeps one block per column, each still backed by its
+        # mapping; the default would consolidate them into private memory
+        return pd.DataFrame(frame, index=index, columns=names, copy=False)
+
+
+if __name__ == '__main__':
+    # Offline ingest step: python crime_store.py
+    store = CrimeDataStore()
+    manifest = store.ingest()
+    print(f"{manifest['rows']} rows, {len(manifest['columns'])} columns written to {SNAPSHOT_DIR}")
@@ -0,0 +1,102 @@
+import os
+import threading
+from functools import lru_cache
+import numpy as np
+import model_registry
+
+# Sentence embedding models, loaded once per process and shared by name.
+# The recommender and the chatbot share EMBEDDING_MODEL, so one copy is
+# loaded. CHATBOT_EMBEDDING_MODEL gives the chatbot its own model instead
+# (e.g. paraphrase-MiniLM-L6-v2, which the old 0.6 threshold was tuned on).
+EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+CHATBOT_EMBEDDING_MODEL = os.environ.get('CHATBOT_EMBEDDING_MODEL', EMBEDDING_MODEL)
+# Texts per forward pass in encode()
+EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 64))
+# Distinct query texts whose embeddings are kept in memory
+EMBEDDING_CACHE_SIZE = int(os.environ.get('EMBEDDING_CACHE_SIZE', 1024))
+
+
+def registry_name(model_name):
+    return f"embedding:{model_name}"
+
+
+def _loader(model_name):
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    return load
+
+for _name in dict.fromkeys([EMBEDDING_MODEL, CHATBOT_EMBEDDING_MODEL]):
+    model_registry.register(registry_name(_name), _loader(_name))
+
+_counters = {'encode_calls': 0, 'texts_encoded': 0}
+_counters_lock = threading.Lock()
+# Whether each loaded model's tokenizer ignores case
+_uncased = {}
+
+
+def _model(model_name):
+    return model_registry.get(registry_name(model_name or EMBEDDING_MODEL))
+
+
+def is_uncased(model_name=None):
+    """Whether the model embeds 'Theft' and 'theft' identically (loads the model)"""
+    model_name = model_name or EMBEDDING_MODEL
+    if model_name not in _uncased:
+        tokenizer = getattr(_model(model_name), 'tokenizer', None)
+        _uncased[model_name] = (tokenizer is not None and
+                                tokenizer.tokenize('Crime Report') == tokenizer.tokenize('crime report'))
+    return _uncased[model_name]
+
+
+def normalize_text(text, lowercase=False):
+    """Cache key for a query: whitespace collapsed, lower-cased only for uncased models"""
+    text = ' '.join(str(text).split())
+    return text.lower() if lowercase else text
+
+
+def encode(texts, batch_size=None, model_name=None):
+    """L2-normalized float32 embeddings for a list of texts, one row per text.
+
+    Rows are unit length, so a dot product is the cosine similarity. An
+    empty list gives a (0, dim) array.
+    """
+    texts = list(texts)
+    with _counters_lock:
+        _counters['encode_calls'] += 1
+        _counters['texts_encoded'] += len(texts)
+    model = _model(model_name)
+    if not texts:
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    embeddings = model.encode(
+        texts,
+        batch_size=batch_size or EMBEDDING_BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True
+    )
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+@lru_cache(maxsize=EMBEDDING_CACHE_SIZE)
+def _cached_query(model_name, key):
+    return encode([key], model_name=model_name)[0]
+
+
+def embed_query(text, model_name=None):
+    """Embedding of a single query, served from the LRU cache when seen before"""
+    model_name = model_name or EMBEDDING_MODEL
+    return _cached_query(model_name, normalize_text(text, lowercase=is_uncased(model_name)))
+
+
+def stats():
+    cache = _cached_query.cache_info()
+    return {
+        'models': {name: model_registry.is_loaded(registry_name(name))
+                   for name in dict.fromkeys([EMBEDDING_MODEL, CHATBOT_EMBEDDING_MODEL])},
+        'encode_calls': _counters['encode_calls'],
+        'texts_encoded': _counters['texts_encoded'],
+        'cache_hits': cache.hits,
+        'cache_misses': cache.misses,
+        'cache_size': cache.currsize,
+        'cache_max_size': cache.maxsize,
+    }
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def series_hash(train_data):
+    """Stable hash of a prepared (ds, y) training series"""
+    payload = train_data.to_csv(index=False).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def write_atomically(path, write, mode='wb'):
+    """Call write(f) on a temp file unique to this writer, then rename it over path"""
+    with tempfile.NamedTemporaryFile(mode, dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.',
+                                     suffix='.tmp', delete=False) as f:
+        tmp_path = f.name
+        try:
+            write(f)
+        except BaseException:
+            f.close()
+            os.remove(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+
+
+def make_key(params, crime, future_years, start_year, train_hash, engine='prophet'):
+    """Cache key from the filter parameters, crime, horizon, training series and engine"""
+    raw = json.dumps({
+        'engine': engine,
+        'params': params or {},
+        'crime': crime,
+        'future_years': future_years,
+        # Yearly forecasts only move when the first forecast year changes
+        'start_year': start_year,
+        'series': train_hash,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ForecastCache:
+    """Two-tier forecast cache: an in-memory LRU in front of pickle files on disk"""
+
+    VERSION_FILE = 'dataset_version'
+
+    def __init__(self, max_entries=256, max_disk_entries=4096, cache_dir='./output/forecast_cache'):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.cache_dir = cache_dir
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        value = None
+        if self.cache_dir:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    value = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                value = None
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+        if self.cache_dir:
+            # Workers writing the same key each use their own temp file
+            write_atomically(self._path(key), lambda f: pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL))
+            self._trim_disk()
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_entries(self):
+        return [name for name in os.listdir(self.cache_dir) if name.endswith('.pkl')]
+
+    def _trim_disk(self):
+        entries = self._disk_entries()
+        if len(entries) <= self.max_disk_entries:
+            return
+        paths = sorted((os.path.join(self.cache_dir, name) for name in entries), key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_disk_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def invalidate(self):
+        """Drop every cached forecast from memory and disk"""
+        with self._lock:
+            self._memory.clear()
+        if self.cache_dir:
+            for name in self._disk_entries():
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    def invalidate_if_changed(self, data_path):
+        """Clear the cache when the source dataset differs from the one it was built on"""
+        if not self.cache_dir:
+            return False
+        current = file_hash(data_path)
+        version_path = os.path.join(self.cache_dir, self.VERSION_FILE)
+        previous = None
+        if os.path.exists(version_path):
+            with open(version_path, 'r') as f:
+                previous = f.read().strip()
+        if previous == current:
+            return False
+        self.invalidate()
+        write_atomically(version_path, lambda f: f.write(current), mode='w')
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'disk_entries': len(self._disk_entries()) if self.cache_dir else 0,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,46 @@
+import multiprocessing
+import os
+import sys
+
+# Production server settings: gunicorn -c gunicorn.conf.py wsgi:app
+# Every setting can be overridden through the environment variables below.
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+
+# Worker processes for CPU-bound work (model inference, pandas) and threads
+# per worker for requests that wait on I/O (geocoding, disk, job polling)
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to bound memory growth; 0 disables it
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# Load the app (and with it every model) in the master before forking
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Torch threads per worker: the cores split between workers, so workers
+# don't oversubscribe the CPU by each starting one thread per core
+torch_threads = int(os.environ.get('TORCH_THREADS', 0)) or max(1, multiprocessing.cpu_count() // workers)
+
+# The master runs torch single-threaded while preloading: an OpenMP pool
+# started before fork is unusable in the children
+os.environ['OMP_NUM_THREADS'] = '1'
+os.environ['MKL_NUM_THREADS'] = '1'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    import model_registry
+    model_registry.set_torch_threads(torch_threads)
+    # Only present when the app was preloaded in the master
+    main = sys.modules.get('main')
+    if main is not None:
+        main.after_fork()
+    server.log.info(f"Worker {worker.pid}: {torch_threads} torch threads")
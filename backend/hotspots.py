@@ -0,0 +1,151 @@
+import json
+import math
+import threading
+from collections import Counter
+
+
+class HotspotEngine:
+    """Grid-density hotspots that update incrementally as incidents arrive.
+
+    Incidents are counted per `cell_degrees` lat/lon cell. A cell with at
+    least `min_points` incidents is dense, and touching dense cells (8-way)
+    form one hotspot. Counts only grow, so a new incident can only make a
+    cell dense or merge hotspots: both are handled with a union-find over
+    dense cells, touching just the incident's cell and its neighbours. The
+    GeoJSON snapshot is rebuilt lazily, only after something changed.
+    """
+
+    def __init__(self, cell_degrees=0.1, min_points=5):
+        self.cell_degrees = cell_degrees
+        self.min_points = min_points
+        self._cells = {}
+        self._parent = {}
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self.version = 0
+        self.historical = 0
+        self.reported = 0
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def _find(self, cell):
+        root = cell
+        while self._parent[root] != root:
+            root = self._parent[root]
+        # Path compression
+        while self._parent[cell] != root:
+            self._parent[cell], cell = root, self._parent[cell]
+        return root
+
+    def _union(self, a, b):
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a != root_b:
+            self._parent[root_b] = root_a
+
+    def _add(self, lat, lon, attack_type, reported):
+        key = self._cell(lat, lon)
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = {'count': 0, 'reported': 0, 'lat_sum': 0.0, 'lon_sum': 0.0,
+                                       'attack_types': Counter()}
+        cell['count'] += 1
+        cell['reported'] += int(reported)
+        cell['lat_sum'] += lat
+        cell['lon_sum'] += lon
+        cell['attack_types'][attack_type or 'Unknown'] += 1
+
+        if cell['count'] == self.min_points:
+            # The cell just became dense: join it to any dense neighbours
+            self._parent[key] = key
+            for dlat in (-1, 0, 1):
+                for dlon in (-1, 0, 1):
+                    neighbour = (key[0] + dlat, key[1] + dlon)
+                    if neighbour != key and neighbour in self._parent:
+                        self._union(key, neighbour)
+        if reported:
+            self.reported += 1
+        else:
+            self.historical += 1
+
+    def add(self, lat, lon, attack_type=None, reported=True):
+        """Add one incident; ignored when it has no coordinates"""
+        if lat is None or lon is None:
+            return False
+        try:
+            lat, lon = float(lat), float(lon)
+        except (TypeError, ValueError):
+            return False
+        if math.isnan(lat) or math.isnan(lon):
+            return False
+        with self._lock:
+            self._add(lat, lon, attack_type, reported)
+            self._snapshot = None
+            self.version += 1
+        return True
+
+    def add_many(self, incidents, reported=False):
+        """Bulk-load (lat, lon, attack_type) tuples"""
+        with self._lock:
+            for lat, lon, attack_type in incidents:
+                if lat is None or lon is None or math.isnan(lat) or math.isnan(lon):
+                    continue
+                self._add(float(lat), float(lon), attack_type, reported)
+            self._snapshot = None
+            self.version += 1
+
+    def add_report(self, report):
+        """Listener for CrimeReporter: feed a newly reported crime in"""
+        return self.add(report.get('latitude'), report.get('longitude'), report.get('attacktype'), reported=True)
+
+    def _build_geojson(self):
+        hotspots = {}
+        for key in self._parent:
+            hotspots.setdefault(self._find(key), []).append(key)
+
+        features = []
+        for keys in hotspots.values():
+            cells = [self._cells[key] for key in keys]
+            count = sum(cell['count'] for cell in cells)
+            attack_types = Counter()
+            for cell in cells:
+                attack_types.update(cell['attack_types'])
+            lats = [key[0] * self.cell_degrees for key in keys]
+            lons = [key[1] * self.cell_degrees for key in keys]
+            features.append({
+                'type': 'Feature',
+                'geometry': {
+                    'type': 'Point',
+                    'coordinates': [
+                        round(sum(cell['lon_sum'] for cell in cells) / count, 6),
+                        round(sum(cell['lat_sum'] for cell in cells) / count, 6),
+                    ],
+                },
+                'properties': {
+                    'incidents': count,
+                    'reported': sum(cell['reported'] for cell in cells),
+                    'cells': len(keys),
+                    'bbox': [round(min(lons), 6), round(min(lats), 6),
+                             round(max(lons) + self.cell_degrees, 6), round(max(lats) + self.cell_degrees, 6)],
+                    'attack_types': dict(attack_types.most_common()),
+                },
+            })
+        features.sort(key=lambda f: f['properties']['incidents'], reverse=True)
+        return json.dumps({
+            'type': 'FeatureCollection',
+            'features': features,
+            'properties': {
+                'version': self.version,
+                'cell_degrees': self.cell_degrees,
+                'min_points': self.min_points,
+                'historical_incidents': self.historical,
+                'reported_incidents': self.reported,
+            },
+        })
+
+    def geojson(self):
+        """Current hotspots as a GeoJSON string, cached until the next update"""
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = self._build_geojson()
+            return self._snapshot
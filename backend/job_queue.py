@@ -0,0 +1,237 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+# Shared by every process serving the app, so any worker can answer for a job
+JOB_STORE_PATH = os.environ.get('JOB_STORE_PATH', './data/jobs.db')
+# How often a running job looks for a cancel request made through another worker
+CANCEL_POLL_SECONDS = 0.5
+
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds its maximum number of unfinished jobs"""
+
+
+class Job:
+    def __init__(self, job_id, on_change=None, cancel_requested=None):
+        self.id = job_id
+        # Called with the job after every state change; checked for outside cancels
+        self.on_change = on_change
+        self.cancel_requested = cancel_requested
+        self._cancel_checked_at = 0
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.partial = {}
+        self.result = None
+        self.error = None
+        self.future = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def add_partial(self, key, value):
+        """Publish an intermediate result while the job is still running"""
+        with self._lock:
+            self.partial[key] = value
+        self.changed()
+
+    def changed(self):
+        if self.on_change:
+            self.on_change(self)
+
+    def is_cancelled(self):
+        if not self._cancel_event.is_set() and self.cancel_requested:
+            now = time.monotonic()
+            if now - self._cancel_checked_at >= CANCEL_POLL_SECONDS:
+                self._cancel_checked_at = now
+                if self.cancel_requested(self.id):
+                    self._cancel_event.set()
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'partial': dict(self.partial),
+                'result': self.result,
+                'error': self.error,
+            }
+
+
+class JobStore:
+    """Job snapshots in SQLite, so jobs submitted to one worker process can be
+    polled and cancelled through any other.
+
+    A connection is opened per call: the store is used from many threads and
+    must stay usable in forked workers.
+    """
+
+    def __init__(self, path=JOB_STORE_PATH):
+        self.path = path
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, status TEXT, finished_at REAL, snapshot TEXT, '
+                'cancel_requested INTEGER DEFAULT 0)'
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def save(self, snapshot):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                'INSERT INTO jobs (id, status, finished_at, snapshot) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET status = excluded.status, '
+                'finished_at = excluded.finished_at, snapshot = excluded.snapshot',
+                (snapshot['job_id'], snapshot['status'], snapshot['finished_at'],
+                 json.dumps(snapshot, default=str))
+            )
+
+    def load(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT snapshot FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def request_cancel(self, job_id):
+        """Flag an unfinished job for cancellation; False if unknown or finished"""
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status IN ('queued', 'running')",
+                (job_id,)
+            )
+        return cursor.rowcount > 0
+
+    def cancel_requested(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def evict_expired(self, ttl_seconds):
+        with closing(self._connect()) as conn, conn:
+            conn.execute('DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?',
+                         (time.time() - ttl_seconds,))
+
+
+class JobQueue:
+    """Bounded worker pool with an in-memory job store.
+
+    At most `max_pending` jobs may be queued or running at once in this
+    process; further submissions raise QueueFullError. Finished jobs are
+    evicted `ttl_seconds` after they complete. With a `store`, every state
+    change is also written there, and get() and cancel() fall back to it for
+    jobs running in another process.
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, ttl_seconds=600, store=None):
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(job, *args, **kwargs) and return the new job id"""
+        with self._lock:
+            self._evict_expired()
+            unfinished = sum(1 for job in self._jobs.values() if not job.finished)
+            if unfinished >= self.max_pending:
+                raise QueueFullError(f"Job queue is full ({unfinished} jobs pending)")
+            if self.store:
+                job = Job(uuid.uuid4().hex, on_change=self._save, cancel_requested=self.store.cancel_requested)
+                job.changed()
+            else:
+                job = Job(uuid.uuid4().hex)
+            self._jobs[job.id] = job
+            # Assigned under the lock so cancel() always sees the future
+            job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _save(self, job):
+        try:
+            self.store.save(job.to_dict())
+        except sqlite3.Error as e:
+            print(f"Warning: could not save job {job.id}: {str(e)}")
+
+    @staticmethod
+    def _mark_cancelled(job):
+        job.finished_at = time.time()
+        job.status = 'cancelled'
+        job.changed()
+
+    def _run(self, job, fn, args, kwargs):
+        if job.is_cancelled():
+            self._mark_cancelled(job)
+            return
+        job.status = 'running'
+        job.started_at = time.time()
+        job.changed()
+        try:
+            result = fn(job, *args, **kwargs)
+            if job.is_cancelled():
+                job.status = 'cancelled'
+            else:
+                job.result = result
+                job.status = 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            job.changed()
+
+    def get(self, job_id):
+        """Snapshot of a job as a dict, or None if unknown or evicted"""
+        with self._lock:
+            self._evict_expired()
+            job = self._jobs.get(job_id)
+        if job:
+            return job.to_dict()
+        return self.store.load(job_id) if self.store else None
+
+    def cancel(self, job_id):
+        """Request cancellation; returns False if the job is unknown or finished"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                # Running in another process, which picks the flag up
+                return self.store.request_cancel(job_id) if self.store else False
+            if job.finished:
+                return False
+            job._cancel_event.set()
+            # Jobs that have not started yet are dropped straight away
+            if job.future.cancel():
+                self._mark_cancelled(job)
+        return True
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in set(statuses)}
+
+    def _evict_expired(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at and now - job.finished_at > self.ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self.store:
+            self.store.evict_expired(self.ttl_seconds)
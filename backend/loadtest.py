@@ -0,0 +1,95 @@
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+# Closed-loop load test: `concurrency` clients each send the next request as
+# soon as the last one answers, cycling through a mix of read endpoints, for
+# `duration` seconds. Compare serving modes against the same mix, e.g.
+#   python main.py                                  (dev server)
+#   gunicorn -c gunicorn.conf.py wsgi:app           (production)
+#   python loadtest.py --url http://127.0.0.1:5000 --duration 30 --concurrency 16
+DEFAULT_PATHS = [
+    '/states',
+    '/years',
+    '/districts?state=maharashtra',
+    '/prevalent-crimes?state=maharashtra',
+    '/ask?crime_type=theft',
+    '/query?input=how+do+I+stay+safe+walking+home+at+night',
+]
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run(url, paths=None, duration=30, concurrency=16, warmup=5, timeout=60):
+    """Latencies and throughput of the server at `url` under a steady request mix"""
+    paths = paths or DEFAULT_PATHS
+    latencies = {path: [] for path in paths}
+    errors = {}
+    lock = threading.Lock()
+
+    def client(worker_id, deadline, record):
+        i = worker_id
+        while time.monotonic() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                with urlopen(Request(url + path), timeout=timeout) as response:
+                    response.read()
+                outcome = None
+            except HTTPError as e:
+                outcome = f"HTTP {e.code}"
+            except (URLError, OSError) as e:
+                outcome = type(e).__name__
+            elapsed = time.perf_counter() - start
+            if record:
+                with lock:
+                    if outcome is None:
+                        latencies[path].append(elapsed)
+                    else:
+                        errors[outcome] = errors.get(outcome, 0) + 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Unmeasured warm-up so lazy loads and caches don't skew the numbers
+        if warmup:
+            deadline = time.monotonic() + warmup
+            list(pool.map(lambda n: client(n, deadline, False), range(concurrency)))
+        started = time.monotonic()
+        deadline = started + duration
+        list(pool.map(lambda n: client(n, deadline, True), range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    every = sorted(value for values in latencies.values() for value in values)
+    ms = lambda value: None if value is None else round(value * 1000, 1)
+    return {
+        'url': url,
+        'concurrency': concurrency,
+        'duration_seconds': round(elapsed, 1),
+        'requests': len(every),
+        'errors': errors,
+        'requests_per_second': round(len(every) / elapsed, 1),
+        'latency_ms': {'p50': ms(_percentile(every, 0.50)), 'p95': ms(_percentile(every, 0.95)),
+                       'p99': ms(_percentile(every, 0.99))},
+        'by_path': {path: {'requests': len(values), 'p50_ms': ms(_percentile(sorted(values), 0.50))}
+                    for path, values in latencies.items()},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load-test a running Protego backend")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--path', action='append', dest='paths',
+                        help="Endpoint to include (repeatable); defaults to a mix of read endpoints")
+    args = parser.parse_args()
+    print(json.dumps(run(args.url.rstrip('/'), args.paths, args.duration, args.concurrency, args.warmup), indent=2))
@@ -1,8 +1,113 @@
-import geocoder
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
 
-def get_location():
-    """Get user's current location using IP geolocation"""
+CLUSTERS_PATH = './data/crime_clusters.csv'
+
+
+def read_crime_clusters(path=CLUSTERS_PATH):
+    """Load the geocoded incident file (its second line repeats the header)"""
+    return pd.read_csv(path, skiprows=[1], encoding='cp1252')
+
+
+def ip_geocoder():
+    """Look up the server's own location by IP; returns (lat, lon, city)"""
+    import geocoder
     g = geocoder.ip('me')
     if g.ok:
         return g.lat, g.lng, g.city
-    raise Exception("Could not determine location")
\ No newline at end of file
+    raise Exception("Could not determine location")
+
+
+class LocationResolver:
+    """Resolves a report's location without blocking on the network.
+
+    Order of preference: coordinates supplied by the client, the cached IP
+    geolocation result, and finally the city name looked up in the
+    crime_clusters city coordinates. The IP lookup runs in the background
+    with a timeout budget; its result (or failure) is cached for `ttl`
+    (or `failure_ttl`) seconds. `geocode` can be swapped for a stub.
+    """
+
+    def __init__(self, geocode=ip_geocoder, timeout=1.0, ttl=3600, failure_ttl=300,
+                 clusters_path=CLUSTERS_PATH):
+        self.geocode = geocode
+        self.timeout = timeout
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.clusters_path = clusters_path
+        self._cached = None
+        self._expires_at = 0
+        self._pending = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='geocoder')
+        self._city_coordinates = None
+
+    def _lookup(self):
+        try:
+            result = self.geocode()
+            ttl = self.ttl
+        except Exception:
+            result, ttl = None, self.failure_ttl
+        with self._lock:
+            self._cached = result
+            self._expires_at = time.monotonic() + ttl
+            self._pending = None
+        return result
+
+    def ip_location(self):
+        """Cached (lat, lon, city) of this server, or None within the timeout budget"""
+        with self._lock:
+            if time.monotonic() < self._expires_at:
+                return self._cached
+            if self._pending is None:
+                self._pending = self._executor.submit(self._lookup)
+            pending = self._pending
+        try:
+            return pending.result(timeout=self.timeout)
+        except Exception:
+            # Still running: answer from the fallback now, the cache fills in later
+            return None
+
+    def city_coordinates(self):
+        """Mean coordinates per lower-cased city name from crime_clusters.csv"""
+        if self._city_coordinates is None:
+            try:
+                clusters = read_crime_clusters(self.clusters_path)
+                means = clusters.groupby(clusters['city'].str.strip().str.lower())[['Latitude', 'Longitude']].mean()
+                self._city_coordinates = {
+                    city: (float(row['Latitude']), float(row['Longitude'])) for city, row in means.iterrows()
+                }
+            except Exception as e:
+                print(f"Warning: could not load city coordinates: {str(e)}")
+                self._city_coordinates = {}
+        return self._city_coordinates
+
+    def resolve(self, data=None):
+        """Return (lat, lon, location_name) for a report payload"""
+        data = data or {}
+        name = data.get('location')
+
+        lat = data.get('latitude', data.get('lat'))
+        lon = data.get('longitude', data.get('lon'))
+        if lat is not None and lon is not None:
+            try:
+                return float(lat), float(lon), name or 'Unknown'
+            except (TypeError, ValueError):
+                pass
+
+        located = self.ip_location()
+        if located is not None:
+            return located
+
+        if name:
+            coords = self.city_coordinates().get(str(name).strip().lower())
+            if coords:
+                return coords[0], coords[1], name
+        return None, None, name or 'Unknown'
+
+
+def get_location():
+    """Get user's current location using IP geolocation"""
+    return ip_geocoder()
@@ -1,63 +1,256 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-import pandas as pd
-from chatbot import CrimeBot
-from crime_analyzer import CrimeAnalyzer
-from crime_reporter import CrimeReporter
-from recommendation import detect_crime
-from recommendation import get_recommendations
-from recommendation import elaborate_recommendations
-from recommendation import score_and_sort_recommendations
-from recommendation import batch_improve_recommendations
 import logging
+import os
+import time
+from urllib.parse import urlencode
+import embeddings
+import model_registry
+
+# Import and construction cost of every component is recorded for /startup
+with model_registry.timed('import:flask'):
+    from flask import Flask, Response, request, jsonify, stream_with_context
+    from flask_cors import CORS
+with model_registry.timed('import:chatbot'):
+    from chatbot import CrimeBot
+with model_registry.timed('import:crime_analyzer'):
+    from crime_analyzer import CrimeAnalyzer
+    from crime_predictor import ENGINES, DEFAULT_ENGINE, NumpyTrendEngine
+with model_registry.timed('import:crime_reporter'):
+    from crime_reporter import CrimeReporter
+    from report_sink import ReportFeed
+    from job_queue import JobQueue, JobStore, QueueFullError
+    from response_cache import ResponseCache
+with model_registry.timed('import:geo'):
+    from spatial_index import SpatialIndex
+    from hotspots import HotspotEngine
+with model_registry.timed('import:recommendation'):
+    from recommendation import detect_crime
+    from recommendation import retrieve_recommendations
+    from recommendation import elaborate_recommendations
+    from recommendation import score_and_sort_recommendations
+    from recommendation import batch_improve_recommendations
 
 app = Flask(__name__)
 app.static_folder = 'output/plots'
-CORS(app)
+CORS(app, expose_headers=['Server-Timing'])
 
 # Configure logging
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
-bot = CrimeBot()
-analyzer = CrimeAnalyzer()
-reporter = CrimeReporter()
+# Models behind these components load on first use; see /warmup
+with model_registry.timed('init:chatbot'):
+    bot = CrimeBot()
+with model_registry.timed('init:crime_analyzer'):
+    analyzer = CrimeAnalyzer()
+with model_registry.timed('init:crime_reporter'):
+    reporter = CrimeReporter()
+# Geocoded historical incidents for /nearby
+with model_registry.timed('init:spatial_index'):
+    spatial_index = SpatialIndex.load()
+NEARBY_DEFAULT_RADIUS_KM = 25
+NEARBY_MAX_RESULTS = 200
+
+# Hotspots from historical incidents plus every crime reported here
+hotspots = HotspotEngine(
+    cell_degrees=float(os.environ.get('HOTSPOT_CELL_DEGREES', 0.1)),
+    min_points=int(os.environ.get('HOTSPOT_MIN_POINTS', 5))
+)
+with model_registry.timed('init:hotspots'):
+    hotspots.add_many(zip(spatial_index.lat, spatial_index.lon,
+                          (spatial_index.attack_types[code] for code in spatial_index.attack_code)))
+# Reports reach hotspots from the storage backend, so every worker process
+# sees every report once the sink has written it
+hotspot_feed = ReportFeed(reporter.sink.backend)
+
+def sync_hotspots():
+    try:
+        for stored in hotspot_feed.poll():
+            hotspots.add_report(stored)
+    except Exception as e:
+        logger.error(f"Could not load stored reports into hotspots: {str(e)}")
+
+with model_registry.timed('init:hotspots_reports'):
+    sync_hotspots()
+
+# Cached bodies for /states, /districts, /years and /prevalent-crimes
+metadata_cache = ResponseCache(max_entries=int(os.environ.get('METADATA_CACHE_ENTRIES', 4096)))
+METADATA_MAX_AGE = int(os.environ.get('METADATA_MAX_AGE', 300))
+
+# Multi-location comparison for /compare
+COMPARE_MAX_LOCATIONS = int(os.environ.get('COMPARE_MAX_LOCATIONS', 50))
+
+# Raw row access for /analyze/rows
+ROWS_STREAM_CHUNK = 500
+ROWS_MAX_PAGE_SIZE = 1000
+
+# Jobs run in the worker process that accepted them; the shared store lets
+# any worker answer /jobs/<id>
+analysis_jobs = JobQueue(
+    max_workers=int(os.environ.get('ANALYSIS_WORKERS', 2)),
+    max_pending=int(os.environ.get('ANALYSIS_MAX_PENDING', 16)),
+    ttl_seconds=int(os.environ.get('ANALYSIS_JOB_TTL', 600)),
+    store=JobStore()
+)
+
+# Set PROTEGO_PRELOAD_MODELS=1 to load every model and index at startup instead of on first use
+if os.environ.get('PROTEGO_PRELOAD_MODELS') == '1':
+    with model_registry.timed('preload'):
+        model_registry.preload()
+
+if os.environ.get('PROTEGO_STARTUP_REPORT') == '1':
+    print("Startup timing:\n" + model_registry.startup_report())
+
+def after_fork():
+    """Restart per-process background threads in a forked worker (see gunicorn.conf.py)"""
+    reporter.sink.after_fork()
+    analyzer.plot_store.after_fork()
+
+@app.before_request
+def refresh_crime_data():
+    """Pick up a changed crime_data.csv before serving (a stat call when unchanged)"""
+    try:
+        if analyzer.refresh_if_changed():
+            # Bodies of the old dataset are dropped when the version changes
+            warm_metadata_cache()
+    except Exception as e:
+        logger.error(f"Could not reload crime data: {str(e)}")
 
 def handle_crime_query(query):
-    response = bot.get_response(query)
-    similar_crimes = bot.get_similar_crimes(query)
-    return response, similar_crimes
+    """Answer /ask and /query from a single bot.understand() pass.
+
+    Returns the JSON body and the stage timings; ?debug=1 adds the emotion,
+    the best intent and crime scores and per-stage milliseconds to the body.
+    """
+    understanding = bot.understand(query)
+    start = time.perf_counter()
+    response = bot.respond(understanding)
+    timings = dict(understanding['timings'], respond=time.perf_counter() - start)
+
+    body = {"response": response, "similar_crimes": understanding['similar_crimes']}
+    if request.args.get('debug', '').lower() in ('1', 'true', 'yes'):
+        body['debug'] = {
+            'emotion': understanding['emotion'],
+            'emotion_score': round(float(understanding['emotion_score']), 4),
+            'intent_score': round(understanding['intent_score'], 4),
+            'crime': understanding['crime'],
+            'crime_score': round(understanding['crime_score'], 4),
+            'timings_ms': {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()},
+        }
+    return body, timings
+
+def fuzzy_arg():
+    """Whether the request opted into substring matching with ?fuzzy=1"""
+    return request.args.get('fuzzy', '').lower() in ('1', 'true', 'yes')
+
+def format_forecast(forecast):
+    """Forecast frame -> list of {year, predicted, confidence_interval}, built column-wise"""
+    years = forecast['ds'].dt.year.to_numpy()
+    predicted = forecast['yhat'].to_numpy().astype(int)
+    lower = forecast['yhat_lower'].to_numpy().astype(int)
+    upper = forecast['yhat_upper'].to_numpy().astype(int)
+    return [
+        {
+            'year': int(year),
+            'predicted': int(yhat),
+            'confidence_interval': f"{low}-{high}"
+        } for year, yhat, low, high in zip(years, predicted, lower, upper)
+    ]
 
 def display_analysis_result(result):
     if isinstance(result, str):
         return result
 
-    data = result['data']
-    df = pd.DataFrame(data)
-    crimes = ['murder', 'rape', 'kidnapping_abduction', 'robbery', 'burglary']
-    total_crimes = df[crimes].sum()
-    
     analysis_results = {
-        'total_records': len(data),
-        'historical_crime_statistics': {crime.replace('_', ' ').title(): int(count) for crime, count in total_crimes.items()},
+        'total_records': result['total_records'],
+        'historical_crime_statistics': {crime.replace('_', ' ').title(): int(count) for crime, count in result['totals'].items()},
         'predictions': {}
     }
     
     if 'predictions' in result and result['predictions']:
         for crime, pred_data in result['predictions'].items():
-            forecast = pred_data['forecast']
-            analysis_results['predictions'][crime.replace('_', ' ').title()] = [
-                {
-                    'year': row['ds'].year,
-                    'predicted': int(row['yhat']),
-                    'confidence_interval': f"{int(row['yhat_lower'])}-{int(row['yhat_upper'])}"
-                } for idx, row in forecast.iterrows()
-            ]
+            analysis_results['predictions'][crime.replace('_', ' ').title()] = format_forecast(pred_data['forecast'])
     
-    analysis_results['plot'] = result['plot']
+    analysis_results['plot_url'] = result['plot_url']
     analysis_results['plot_path'] = result['plot_path']
     return analysis_results
 
+def build_analysis_params(data):
+    """Validate an /analyze payload; returns (params, error_message)"""
+    # Extract parameters
+    params = {
+        'state': data.get('state'),
+        'district': data.get('district'),
+        'years': data.get('years', []),
+        'crimes': data.get('crimes', []),
+        'predict_years': data.get('predict_years', 0),
+        # Opt into case-insensitive substring matching of state/district names
+        'fuzzy': bool(data.get('fuzzy', False)),
+        # Forecasting backend: 'prophet' or the fast 'numpy' trend engine
+        'engine': data.get('engine') or DEFAULT_ENGINE
+    }
+
+    if params['engine'] not in ENGINES:
+        return None, f"Unknown forecasting engine. Choose from: {', '.join(ENGINES)}."
+
+    # Validate at least one location parameter is provided
+    if not params['state'] and not params['district']:
+        return None, "You must specify either a state or a district."
+
+    # Validate years
+    available_years = analyzer.get_years(params['state'], params['district'], params['fuzzy'])
+    if params['years']:
+        # Filter out invalid years
+        params['years'] = [year for year in params['years'] if year in available_years]
+        if not params['years']:
+            params['years'] = available_years  # Use all available years if no valid years are provided
+    else:
+        params['years'] = available_years  # Use all available years if no years are provided
+
+    # Validate crimes
+    prevalent_crimes = analyzer.get_prevalent_crimes(params['state'], params['district'], params['fuzzy'])
+    if params['crimes']:
+        # Keep known crime columns and groups (e.g. 'theft', 'violent'; 'all' for every column)
+        params['crimes'] = analyzer.categories.resolve(params['crimes'])
+        if not params['crimes']:
+            params['crimes'] = [crime[0] for crime in prevalent_crimes]  # Use all crimes if no valid crimes are provided
+    else:
+        params['crimes'] = [crime[0] for crime in prevalent_crimes]  # Use all crimes if no crimes are provided
+
+    # Validate predict_years
+    if params['predict_years']:
+        if not (1 <= params['predict_years'] <= 100):
+            return None, "Prediction years must be between 1 and 100."
+
+    return params, None
+
+def run_analysis_job(job, params):
+    """Worker body for queued /analyze requests"""
+    def publish(crime, pred_result):
+        job.add_partial(crime.replace('_', ' ').title(), format_forecast(pred_result['forecast']))
+
+    result = analyzer.generate_analysis(params, on_prediction=publish, is_cancelled=job.is_cancelled)
+    return display_analysis_result(result)
+
+def attach_compare_forecasts(result):
+    """Move compare() forecasts, keyed by (location position, crime), onto each location"""
+    for location in result['locations']:
+        location['predictions'] = {}
+    for (i, crime), forecast in result.pop('forecasts').items():
+        result['locations'][i]['predictions'][crime] = format_forecast(forecast)
+    return result
+
+def run_compare_job(job, locations, options):
+    """Worker body for /compare requests that forecast with a slow engine"""
+    predictions = {}
+
+    def publish(key, forecast):
+        i, crime = key
+        predictions.setdefault(i, {})[crime] = format_forecast(forecast)
+        job.add_partial(str(i), dict(predictions[i]))
+
+    result = analyzer.compare(locations, on_forecast=publish, is_cancelled=job.is_cancelled, **options)
+    return attach_compare_forecasts(result)
+
 # API Endpoints
 @app.route('/analyze', methods=['POST'])
 def analyze():
@@ -69,52 +262,127 @@ def analyze():
         if not data:
             return jsonify({"error": "No data provided. Please provide analysis parameters."}), 400
 
-        # Extract parameters
-        params = {
-            'state': data.get('state'),
-            'district': data.get('district'),
-            'years': data.get('years', []),
-            'crimes': data.get('crimes', []),
-            'predict_years': data.get('predict_years', 0)
+        params, error = build_analysis_params(data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        # Legacy blocking mode
+        if data.get('wait'):
+            result = analyzer.generate_analysis(params)
+            return jsonify(display_analysis_result(result))
+
+        try:
+            job_id = analysis_jobs.submit(run_analysis_job, params)
+        except QueueFullError as e:
+            return jsonify({"error": str(e)}), 503, {'Retry-After': '5'}
+
+        return jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+
+    except Exception as e:
+        logger.error(f"Error in /analyze endpoint: {str(e)}")
+        return jsonify({"error": "An internal error occurred while processing your request."}), 500
+
+@app.route('/compare', methods=['POST'])
+def compare():
+    """Compare many states/districts at once: totals, YoY growth, rankings and optional forecasts"""
+    try:
+        data = request.json
+        if not data or not isinstance(data.get('locations'), list) or not data['locations']:
+            return jsonify({"error": "Please provide a non-empty list of locations."}), 400
+
+        locations = data['locations']
+        if len(locations) > COMPARE_MAX_LOCATIONS:
+            return jsonify({"error": f"At most {COMPARE_MAX_LOCATIONS} locations can be compared at once."}), 400
+        # A bare string is taken as a state name
+        locations = [{'state': loc} if isinstance(loc, str) else loc for loc in locations]
+        if any(not isinstance(loc, dict) or not (loc.get('state') or loc.get('district')) for loc in locations):
+            return jsonify({"error": "Every location needs a state or a district."}), 400
+
+        # Raises ValueError (a 400) for a location listed twice
+        analyzer.compare_labels(locations)
+
+        predict_years = data.get('predict_years', 0)
+        if predict_years and not (1 <= predict_years <= 100):
+            return jsonify({"error": "Prediction years must be between 1 and 100."}), 400
+        engine = data.get('engine') or DEFAULT_ENGINE
+        if engine not in ENGINES:
+            return jsonify({"error": f"Unknown forecasting engine. Choose from: {', '.join(ENGINES)}."}), 400
+
+        options = {
+            'crimes': data.get('crimes'),
+            'years': data.get('years'),
+            'fuzzy': bool(data.get('fuzzy', False)),
+            'predict_years': predict_years,
+            'engine': engine,
         }
 
-        # Validate at least one location parameter is provided
-        if not params['state'] and not params['district']:
-            return jsonify({"error": "You must specify either a state or a district."}), 400
+        # Up to COMPARE_MAX_LOCATIONS x crimes model fits: only the NumPy
+        # trend engine is fast enough to answer inline, others run as a job
+        if predict_years and engine != NumpyTrendEngine.name:
+            try:
+                job_id = analysis_jobs.submit(run_compare_job, locations, options)
+            except QueueFullError as e:
+                return jsonify({"error": str(e)}), 503, {'Retry-After': '5'}
+            return jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
 
-        # Validate years
-        available_years = analyzer.get_years(params['state'], params['district'])
-        if params['years']:
-            # Filter out invalid years
-            params['years'] = [year for year in params['years'] if year in available_years]
-            if not params['years']:
-                params['years'] = available_years  # Use all available years if no valid years are provided
-        else:
-            params['years'] = available_years  # Use all available years if no years are provided
-
-        # Validate crimes
-        prevalent_crimes = analyzer.get_prevalent_crimes(params['state'], params['district'])
-        if params['crimes']:
-            # Filter out invalid crimes
-            params['crimes'] = [crime for crime in params['crimes'] if crime in [c[0] for c in prevalent_crimes]]
-            if not params['crimes']:
-                params['crimes'] = [crime[0] for crime in prevalent_crimes]  # Use all crimes if no valid crimes are provided
-        else:
-            params['crimes'] = [crime[0] for crime in prevalent_crimes]  # Use all crimes if no crimes are provided
+        return jsonify(attach_compare_forecasts(analyzer.compare(locations, **options)))
 
-        # Validate predict_years
-        if params['predict_years']:
-            if not (1 <= params['predict_years'] <= 100):
-                return jsonify({"error": "Prediction years must be between 1 and 100."}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in /compare endpoint: {str(e)}")
+        return jsonify({"error": "An internal error occurred while processing your request."}), 500
 
-        # Generate analysis
-        result = analyzer.generate_analysis(params)
-        return jsonify(display_analysis_result(result))
+@app.route('/analyze/rows', methods=['GET'])
+def analyze_rows():
+    """Raw dataset rows for a location, paginated or streamed as NDJSON (?format=ndjson)"""
+    try:
+        state = request.args.get('state')
+        district = request.args.get('district')
+        if not state and not district:
+            return jsonify({"error": "You must specify either a state or a district."}), 400
 
+        years = [int(year) for year in request.args.get('years', '').split(',') if year.strip()]
+        # Only the requested columns are read from the dataset snapshot
+        columns = [c.strip() for c in request.args.get('columns', '').split(',') if c.strip()]
+        rows = analyzer.filter_rows({'state': state, 'district': district, 'years': years, 'fuzzy': fuzzy_arg()},
+                                    columns or None)
+
+        if request.args.get('format') == 'ndjson':
+            def generate():
+                for start in range(0, len(rows), ROWS_STREAM_CHUNK):
+                    chunk = rows.iloc[start:start + ROWS_STREAM_CHUNK].to_json(orient='records', lines=True)
+                    yield chunk.rstrip('\n') + '\n'
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        page = max(int(request.args.get('page', 1)), 1)
+        page_size = min(max(int(request.args.get('page_size', 100)), 1), ROWS_MAX_PAGE_SIZE)
+        page_rows = rows.iloc[(page - 1) * page_size:page * page_size]
+        return Response(
+            '{"total_records": %d, "page": %d, "page_size": %d, "rows": %s}' % (
+                len(rows), page, page_size, page_rows.to_json(orient='records')),
+            mimetype='application/json'
+        )
+
+    except ValueError:
+        return jsonify({"error": "years, page and page_size must be integers."}), 400
     except Exception as e:
-        logger.error(f"Error in /analyze endpoint: {str(e)}")
+        logger.error(f"Error in /analyze/rows endpoint: {str(e)}")
         return jsonify({"error": "An internal error occurred while processing your request."}), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found or expired."}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    if not analysis_jobs.cancel(job_id):
+        return jsonify({"error": "Job not found or already finished."}), 404
+    return jsonify(analysis_jobs.get(job_id))
+
 @app.route('/report', methods=['POST'])
 def report():
     try:
@@ -130,7 +398,7 @@ def report():
         
         # Generate recommendations using functions from /chat endpoint
         detected_crimes = detect_crime(crime_summary)
-        all_recommendations = get_recommendations(detected_crimes)
+        all_recommendations = retrieve_recommendations(crime_summary, detected_crimes)
         
         recommendations_message = ""
         if all_recommendations:
@@ -149,6 +417,45 @@ def report():
         logger.error(f"Error in /report endpoint: {str(e)}")
         return jsonify({"error": "An internal error occurred while processing your request."}), 500
 
+@app.route('/report/stats', methods=['GET'])
+def get_report_stats():
+    return jsonify(reporter.sink.stats())
+
+@app.route('/nearby', methods=['GET'])
+def nearby():
+    """Historical incidents near a point: ?lat=&lon= plus radius_km and/or k"""
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        radius_km = request.args.get('radius_km', type=float)
+        k = request.args.get('k', type=int)
+        year = request.args.get('year', type=int)
+        attack_type = request.args.get('attack_type')
+    except (KeyError, ValueError):
+        return jsonify({"error": "Please provide numeric lat and lon."}), 400
+
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({"error": "lat/lon out of range."}), 400
+    if radius_km is not None and radius_km <= 0:
+        return jsonify({"error": "radius_km must be positive."}), 400
+
+    try:
+        if k is not None:
+            incidents = spatial_index.nearest(lat, lon, k=max(1, min(k, NEARBY_MAX_RESULTS)),
+                                              attack_type=attack_type, year=year, max_km=radius_km)
+        else:
+            incidents = spatial_index.radius(lat, lon, radius_km or NEARBY_DEFAULT_RADIUS_KM,
+                                             attack_type=attack_type, year=year, limit=NEARBY_MAX_RESULTS)
+        return jsonify({"count": len(incidents), "incidents": incidents})
+    except Exception as e:
+        logger.error(f"Error in /nearby endpoint: {str(e)}")
+        return jsonify({"error": "An internal error occurred while processing your request."}), 500
+
+@app.route('/hotspots', methods=['GET'])
+def get_hotspots():
+    sync_hotspots()
+    return Response(hotspots.geojson(), mimetype='application/geo+json')
+
 @app.route('/similar', methods=['GET'])
 def similar():
     try:
@@ -173,8 +480,8 @@ def ask():
         if not crime_type:
             return jsonify({"error": "Please specify a crime type to ask about."}), 400
         
-        response, similar_crimes = handle_crime_query(crime_type)
-        return jsonify({"response": response, "similar_crimes": similar_crimes})
+        body, timings = handle_crime_query(crime_type)
+        return jsonify(body), 200, {'Server-Timing': server_timing(timings)}
 
     except Exception as e:
         logger.error(f"Error in /ask endpoint: {str(e)}")
@@ -187,18 +494,52 @@ def query():
         if not user_input:
             return jsonify({"error": "Please provide an input."}), 400
         
-        response, similar_crimes = handle_crime_query(user_input)
-        return jsonify({"response": response, "similar_crimes": similar_crimes})
+        body, timings = handle_crime_query(user_input)
+        return jsonify(body), 200, {'Server-Timing': server_timing(timings)}
 
     except Exception as e:
         logger.error(f"Error in /query endpoint: {str(e)}")
         return jsonify({"error": "An internal error occurred while processing your request."}), 500
 
+def cached_metadata(build):
+    """Serve a read-only metadata body from metadata_cache with ETag/304 handling.
+
+    The body is built once per dataset version and query string; the ETag
+    depends only on those, so If-None-Match is answered before any lookup.
+    """
+    version = analyzer.version
+    key = request.path + '?' + urlencode(sorted(request.args.items(multi=True)))
+    etag = metadata_cache.etag(version, key)
+    if request.if_none_match.contains(etag):
+        metadata_cache.record_not_modified()
+        response = Response(status=304)
+    else:
+        body = metadata_cache.get_or_build(version, key, lambda: app.json.dumps(build()) + '\n')
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f"public, max-age={METADATA_MAX_AGE}"
+    return response
+
+def warm_metadata_cache():
+    """Precompute the bodies the dashboard asks for first: states and per-state lookups"""
+    version = analyzer.version
+    metadata_cache.get_or_build(version, '/states?', lambda: app.json.dumps({'states': analyzer.states}) + '\n')
+    for state in analyzer.states:
+        for path, build in (
+            ('/districts', lambda: {'districts': analyzer.get_districts(state)}),
+            ('/years', lambda: {'years': analyzer.get_years(state)}),
+            ('/prevalent-crimes', lambda: {'prevalent_crimes': analyzer.get_prevalent_crimes(state)}),
+        ):
+            metadata_cache.get_or_build(version, path + '?' + urlencode([('state', state)]),
+                                        lambda: app.json.dumps(build()) + '\n')
+
+with model_registry.timed('init:metadata_cache'):
+    warm_metadata_cache()
+
 @app.route('/states', methods=['GET'])
 def get_available_states():
     try:
-        states = analyzer.states
-        return jsonify({'states': states})
+        return cached_metadata(lambda: {'states': analyzer.states})
     except Exception as e:
         logger.error(f"Error in /states endpoint: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -209,8 +550,7 @@ def get_available_districts():
         state = request.args.get('state')
         if not state:
             return jsonify({'error': 'State parameter is required'}), 400
-        districts = analyzer.get_districts(state)
-        return jsonify({'districts': districts})
+        return cached_metadata(lambda: {'districts': analyzer.get_districts(state, fuzzy_arg())})
     except Exception as e:
         logger.error(f"Error in /districts endpoint: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -221,8 +561,7 @@ def get_years():
         state = request.args.get('state')
         district = request.args.get('district')
         
-        years = analyzer.get_years(state, district)
-        return jsonify({"years": years})
+        return cached_metadata(lambda: {"years": analyzer.get_years(state, district, fuzzy_arg())})
     except Exception as e:
         logger.error(f"Error in /years endpoint: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -232,35 +571,106 @@ def get_prevalent_crimes():
     try:
         state = request.args.get('state')
         district = request.args.get('district')
+        # Optional comma-separated crime columns and groups, or 'all'
+        crimes = [c.strip() for c in request.args.get('crimes', '').split(',') if c.strip()]
         
-        prevalent_crimes = analyzer.get_prevalent_crimes(state, district)
-        return jsonify({"prevalent_crimes": prevalent_crimes})
+        return cached_metadata(
+            lambda: {"prevalent_crimes": analyzer.get_prevalent_crimes(state, district, fuzzy_arg(), crimes)})
     except Exception as e:
         logger.error(f"Error in /prevalent-crimes endpoint: {str(e)}")
         return jsonify({"error": str(e)}), 500
+
+@app.route('/metadata-cache', methods=['GET'])
+def get_metadata_cache_stats():
+    return jsonify(metadata_cache.stats())
         
+@app.route('/crime-categories', methods=['GET'])
+def get_crime_categories():
+    return jsonify(analyzer.categories.to_dict())
+
+@app.route('/models', methods=['GET'])
+def get_model_stats():
+    try:
+        stats = model_registry.stats()
+        stats['embeddings'] = embeddings.stats()
+        return jsonify(stats)
+    except Exception as e:
+        logger.error(f"Error in /models endpoint: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/warmup', methods=['POST'])
+def warmup():
+    """Load every model and index now, so the first real request does not pay for it"""
+    try:
+        start = time.perf_counter()
+        model_registry.preload()
+        stats = model_registry.stats()
+        stats['warmup_seconds'] = round(time.perf_counter() - start, 3)
+        return jsonify(stats)
+    except Exception as e:
+        logger.error(f"Error in /warmup endpoint: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/startup', methods=['GET'])
+def startup_report():
+    """Import and load time per component, slowest first, as plain text"""
+    return Response(model_registry.startup_report() + '\n', mimetype='text/plain')
+
+def server_timing(timings):
+    """Format stage timings (seconds) as a Server-Timing header value"""
+    return ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+@app.route('/plots/stats', methods=['GET'])
+def get_plot_stats():
+    return jsonify({
+        'store': analyzer.plot_store.stats(),
+        'renderer': analyzer.renderer.stats()
+    })
+
+@app.route('/forecast-cache', methods=['GET'])
+def get_forecast_cache_stats():
+    return jsonify(analyzer.predictor.cache.stats())
+
+@app.route('/forecast-cache', methods=['DELETE'])
+def clear_forecast_cache():
+    analyzer.predictor.cache.invalidate()
+    return jsonify(analyzer.predictor.cache.stats())
+
 @app.route("/chat", methods=["POST"])
 def chat():
     user_query = request.json.get("query", "").strip()
     if not user_query:
         return "Please provide a valid query."
 
+    timings = {}
+    start = time.perf_counter()
+
     # Detect multiple potential crimes
     detected_crimes = detect_crime(user_query)
+    timings['detect'] = time.perf_counter() - start
     
-    # Get all recommendations across detected crimes
-    all_recommendations = get_recommendations(detected_crimes)
+    # Stage one: recommendations from the scenarios that best match the query
+    start = time.perf_counter()
+    all_recommendations = retrieve_recommendations(user_query, detected_crimes)
+    timings['retrieve'] = time.perf_counter() - start
     
     if not all_recommendations:
-        return f"Detected potential crimes: {', '.join(detected_crimes)}.\n No recommendations found."
+        body = f"Detected potential crimes: {', '.join(detected_crimes)}.\n No recommendations found."
+        return body, 200, {'Server-Timing': server_timing(timings)}
 
+    # Stage two: rank the retrieved recommendations by sentiment
+    start = time.perf_counter()
     sentiment_score = score_and_sort_recommendations(user_query, all_recommendations)
+    timings['rank'] = time.perf_counter() - start
 
+    start = time.perf_counter()
     elaborated_recommendations = elaborate_recommendations(sentiment_score)
-
     filtered_recommendations = batch_improve_recommendations(elaborated_recommendations)
+    timings['generate'] = time.perf_counter() - start
     
-    return f"Based on your query, I identified the crime as {', '.join(detected_crimes)}.\n Here is my suggestion: {filtered_recommendations}" 
+    body = f"Based on your query, I identified the crime as {', '.join(detected_crimes)}.\n Here is my suggestion: {filtered_recommendations}"
+    return body, 200, {'Server-Timing': server_timing(timings)}
 
+# Development server only; for production use gunicorn -c gunicorn.conf.py wsgi:app
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
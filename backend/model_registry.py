@@ -0,0 +1,141 @@
+import os
+import sys
+import threading
+import time
+import resource
+from contextlib import contextmanager
+
+# Process-wide registry of heavy models. Each model is registered with a
+# loader function and built at most once, on first use or through preload().
+_loaders = {}
+_models = {}
+_stats = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+# Other heavy components: timings of imports and lazy loads, and warm-up
+# callables run by preload() alongside the models
+_timings = {}
+_warmups = {}
+
+
+def _current_rss_mb():
+    """Resident memory of this process in MB"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * resource.getpagesize() / (1024 * 1024)
+    except (OSError, IndexError, ValueError):
+        # Fall back to peak RSS (reported in KB on Linux)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def register(name, loader):
+    """Register a loader for a named model without loading it"""
+    with _registry_lock:
+        _loaders[name] = loader
+        _locks.setdefault(name, threading.Lock())
+        _stats.setdefault(name, {'loaded': False})
+
+
+def get(name):
+    """Return the named model, loading it once if needed"""
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    if name not in _loaders:
+        raise KeyError(f"No model registered under '{name}'")
+
+    # Only one thread builds a given model; the others wait for it
+    with _locks[name]:
+        model = _models.get(name)
+        if model is not None:
+            return model
+
+        rss_before = _current_rss_mb()
+        start = time.perf_counter()
+        model = _loaders[name]()
+        load_seconds = time.perf_counter() - start
+        rss_after = _current_rss_mb()
+
+        _stats[name] = {
+            'loaded': True,
+            'load_seconds': round(load_seconds, 3),
+            'rss_delta_mb': round(rss_after - rss_before, 1),
+            'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        _models[name] = model
+        return model
+
+
+def is_loaded(name):
+    return name in _models
+
+
+@contextmanager
+def timed(name):
+    """Record how long a block (an import, a data load) takes and its RSS growth"""
+    rss_before = _current_rss_mb()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings[name] = {
+            'seconds': round(time.perf_counter() - start, 3),
+            'rss_delta_mb': round(_current_rss_mb() - rss_before, 1),
+        }
+
+
+def register_warmup(name, fn):
+    """Register a non-model component to initialize during preload()"""
+    with _registry_lock:
+        _warmups[name] = fn
+
+
+def preload(names=None):
+    """Eagerly load the given models, or every model and warm-up by default"""
+    for name in (names or list(_loaders)):
+        get(name)
+    if names is None:
+        for name, fn in list(_warmups.items()):
+            with timed(name):
+                fn()
+
+
+def set_torch_threads(n):
+    """Cap torch's intra-op thread pool in this process.
+
+    Takes effect immediately if torch is already imported, otherwise when
+    it is (torch sizes its pool from OMP_NUM_THREADS on first use).
+    """
+    os.environ['OMP_NUM_THREADS'] = str(n)
+    os.environ['MKL_NUM_THREADS'] = str(n)
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(n)
+
+
+def torch_threads():
+    """Intra-op threads torch uses here, or None if torch is not loaded"""
+    torch = sys.modules.get('torch')
+    return torch.get_num_threads() if torch is not None else None
+
+
+def stats():
+    """Load time and memory figures for every registered model and component"""
+    return {
+        'process_rss_mb': round(_current_rss_mb(), 1),
+        'pid': os.getpid(),
+        'torch_threads': torch_threads(),
+        'models': {name: dict(info) for name, info in _stats.items()},
+        'components': {name: dict(info) for name, info in _timings.items()},
+    }
+
+
+def startup_report():
+    """One line per timed component and loaded model, slowest first"""
+    rows = [(name, info['seconds'], info['rss_delta_mb']) for name, info in _timings.items()]
+    rows += [(name, info['load_seconds'], info['rss_delta_mb']) for name, info in _stats.items() if info.get('loaded')]
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return '\n'.join(f"{name:<32} {seconds:>8.3f}s {rss:>+8.1f} MB" for name, seconds, rss in rows)
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from forecast_cache import write_atomically
+
+
+def trend_plot_spec(title, yearly, predictions):
+    """Everything that determines a trend plot, as plain JSON-able data.
+
+    yearly is a year-indexed DataFrame of historical counts per crime and
+    predictions maps crime -> forecast DataFrame.
+    """
+    return {
+        'title': title,
+        'years': [int(year) for year in yearly.index],
+        'history': {crime: yearly[crime].astype(float).tolist() for crime in yearly.columns},
+        'predictions': {
+            crime: {
+                'years': forecast['ds'].dt.year.astype(int).tolist(),
+                'yhat': forecast['yhat'].astype(float).tolist(),
+                'yhat_lower': forecast['yhat_lower'].astype(float).tolist(),
+                'yhat_upper': forecast['yhat_upper'].astype(float).tolist(),
+            }
+            for crime, forecast in predictions.items()
+        },
+    }
+
+
+def spec_hash(spec):
+    raw = json.dumps(spec, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def draw_trend_plot(spec):
+    """Render a spec to PNG bytes with the object-oriented Figure API"""
+    # matplotlib is only imported once the first plot is drawn
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=(12, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    # Plot historical data
+    for crime, counts in spec['history'].items():
+        ax.plot(spec['years'], counts, marker='o', label=crime)
+
+    for crime, forecast in spec['predictions'].items():
+        # Plot prediction line
+        ax.plot(forecast['years'], forecast['yhat'], '--', label=f'{crime} (predicted)')
+        # Plot confidence intervals
+        ax.fill_between(forecast['years'], forecast['yhat_lower'], forecast['yhat_upper'], alpha=0.2)
+
+    ax.set_title(spec['title'])
+    ax.set_xlabel('Year')
+    ax.set_ylabel('Number of Cases')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.legend()
+    fig.tight_layout()
+
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+class PlotRenderer:
+    """Renders plots on a dedicated worker thread into a content-addressed cache.
+
+    A plot's file name is derived from a hash of its spec, so identical
+    requests reuse the same PNG and concurrent identical requests share one
+    render.
+    """
+
+    def __init__(self, output_dir='./output/plots', url_prefix='/static', store=None):
+        self.output_dir = output_dir
+        self.url_prefix = url_prefix
+        # Optional PlotStore that bounds the directory; cache hits refresh its LRU order
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='plot-render')
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.cache_hits = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def filename_for(self, spec):
+        return f"crime_analysis_{spec_hash(spec)[:32]}.png"
+
+    def _write(self, spec, path):
+        png = draw_trend_plot(spec)
+        write_atomically(path, lambda f: f.write(png))
+        return path
+
+    def submit(self, spec):
+        """Start rendering (unless cached); returns (filename, future)"""
+        filename = self.filename_for(spec)
+        path = os.path.join(self.output_dir, filename)
+        with self._lock:
+            if filename in self._in_flight:
+                return filename, self._in_flight[filename]
+            if os.path.exists(path):
+                self.cache_hits += 1
+                if self.store:
+                    self.store.touch(path)
+                return filename, None
+            self.renders += 1
+            future = self._executor.submit(self._write, spec, path)
+            self._in_flight[filename] = future
+        future.add_done_callback(lambda _: self._done(filename))
+        return filename, future
+
+    def _done(self, filename):
+        with self._lock:
+            self._in_flight.pop(filename, None)
+
+    def render(self, spec, timeout=None):
+        """Render (or reuse) a plot and return its file path and URL"""
+        filename, future = self.submit(spec)
+        if future is not None:
+            future.result(timeout=timeout)
+        return {
+            'plot_path': os.path.join(self.output_dir, filename),
+            'plot_url': f"{self.url_prefix}/{filename}",
+        }
+
+    def in_flight(self):
+        """Names of plots currently being rendered"""
+        with self._lock:
+            return set(self._in_flight)
+
+    def stats(self):
+        with self._lock:
+            return {'renders': self.renders, 'cache_hits': self.cache_hits, 'in_flight': len(self._in_flight)}
@@ -0,0 +1,125 @@
+import os
+import re
+import threading
+import time
+
+# Content-addressed plots written by PlotRenderer. Anything else in the
+# directory (sample plots checked into git, a render's temporary file) is
+# never evicted.
+MANAGED_PLOT = re.compile(r'^crime_analysis_[0-9a-f]{32}\.png$')
+
+
+class PlotStore:
+    """Keeps a plot directory within a size and age budget.
+
+    A background thread sweeps the directory every `sweep_interval` seconds:
+    files older than `max_age_seconds` are removed, then the least recently
+    used files (by mtime) until the total is under `max_bytes`. Only files
+    matching MANAGED_PLOT are considered. `in_use` is a callable returning
+    file names that must not be evicted, such as plots still being rendered.
+    """
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, max_age_seconds=7 * 24 * 3600,
+                 sweep_interval=300, in_use=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.sweep_interval = sweep_interval
+        self.in_use = in_use or (lambda: set())
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.last_sweep = None
+        self._usage = {'files': 0, 'bytes': 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def touch(self, path):
+        """Mark a plot as recently used so size-based eviction keeps it longer"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and MANAGED_PLOT.match(entry.name):
+                stat = entry.stat()
+                entries.append((entry.name, entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def sweep(self):
+        """Run one eviction pass; returns the number of files removed"""
+        with self._lock:
+            now = time.time()
+            protected = self.in_use()
+            all_entries = self._entries()
+            entries = [e for e in all_entries if e[0] not in protected]
+            protected_bytes = sum(e[2] for e in all_entries if e[0] in protected)
+            removed = []
+
+            # Age-based eviction
+            for entry in entries:
+                if now - entry[3] > self.max_age_seconds:
+                    removed.append(entry)
+            remaining = sorted((e for e in entries if e not in removed), key=lambda e: e[3])
+
+            # Size-based eviction, oldest first
+            total = protected_bytes + sum(e[2] for e in remaining)
+            while remaining and total > self.max_bytes:
+                entry = remaining.pop(0)
+                removed.append(entry)
+                total -= entry[2]
+
+            for name, path, size, mtime in removed:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self.evicted_files += 1
+                self.evicted_bytes += size
+
+            kept = self._entries()
+            self._usage = {'files': len(kept), 'bytes': sum(e[2] for e in kept)}
+            self.last_sweep = now
+            return len(removed)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Warning: plot store sweep failed: {str(e)}")
+            self._stop.wait(self.sweep_interval)
+
+    def start(self):
+        """Start the background sweeper (idempotent)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='plot-store-sweeper', daemon=True)
+            self._thread.start()
+
+    def after_fork(self):
+        """Restart the sweeper in a forked child; the parent's thread did not survive the fork"""
+        running = self._thread is not None and not self._stop.is_set()
+        self._lock = threading.Lock()
+        self._thread = None
+        if running:
+            self.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'directory': self.directory,
+                'disk_usage_bytes': self._usage['bytes'],
+                'files': self._usage['files'],
+                'max_bytes': self.max_bytes,
+                'max_age_seconds': self.max_age_seconds,
+                'evicted_files': self.evicted_files,
+                'evicted_bytes': self.evicted_bytes,
+                'last_sweep': self.last_sweep,
+            }
@@ -1,68 +1,139 @@
 import json
-import torch
-from sentence_transformers import SentenceTransformer, util
-from transformers import pipeline
+import os
+import threading
+import numpy as np
+import embeddings
+import model_registry
+import recommendation_index
 
-# Load Sentence-BERT for crime detection
-sbert_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+# Heavy models are registered here and only built on first use (or by
+# model_registry.preload()), so importing this module stays cheap. Crime and
+# scenario matching use the shared embedding model in embeddings.py
 
-# Load DistilBERT for sentiment analysis
-sentiment_pipeline = pipeline("sentiment-analysis")
+# DistilBERT for sentiment analysis
+def _load_sentiment():
+    from transformers import pipeline
+    return pipeline("sentiment-analysis")
 
-# Load recommendations JSON
-with open("./data/recommendations.json", "r") as f:
-    recommendations_data = json.load(f)
+# FLAN-T5 text improver, built once per process and shared by all requests
+def _load_text_improver():
+    import torch
+    from transformers import pipeline
+    return pipeline(
+        "text2text-generation",
+        model="google/flan-t5-small",
+        device=0 if torch.cuda.is_available() else -1
+    )
+
+model_registry.register("sentiment", _load_sentiment)
+model_registry.register("text_improver", _load_text_improver)
+
+# Number of texts scored per sentiment forward pass
+SENTIMENT_BATCH_SIZE = int(os.environ.get("SENTIMENT_BATCH_SIZE", 32))
+
+def _signed_score(result):
+    return result["score"] if result["label"] == "POSITIVE" else -result["score"]
+
+def get_sentiments(texts, batch_size=None):
+    """Score many texts in one batched pipeline call"""
+    if not texts:
+        return []
+    results = model_registry.get("sentiment")(list(texts), batch_size=batch_size or SENTIMENT_BATCH_SIZE)
+    return [_signed_score(result) for result in results]
+
+# Load recommendations JSON and its precomputed embedding/sentiment index
+def _load_recommendations():
+    with open(recommendation_index.SOURCE_PATH, "r") as f:
+        data = json.load(f)
+    index = recommendation_index.load_or_build(data, embeddings.encode, get_sentiments, embeddings.EMBEDDING_MODEL)
+    return data, index, os.path.getmtime(recommendation_index.SOURCE_PATH)
+
+# Filled in on first use by _refresh_if_changed()
+recommendations_data, rec_index, _source_mtime = None, None, None
+_data_lock = threading.Lock()
+
+def rebuild_index():
+    """Force a rebuild of the recommendation index from the current JSON"""
+    global recommendations_data, rec_index, _source_mtime
+    with _data_lock:
+        with open(recommendation_index.SOURCE_PATH, "r") as f:
+            recommendations_data = json.load(f)
+        with recommendation_index.build_lock():
+            rec_index = recommendation_index.build(recommendations_data, embeddings.encode, get_sentiments,
+                                                   embeddings.EMBEDDING_MODEL)
+        _source_mtime = os.path.getmtime(recommendation_index.SOURCE_PATH)
+
+def _refresh_if_changed():
+    """Load the JSON and its index on first use, and again when the file changes on disk"""
+    global recommendations_data, rec_index, _source_mtime
+    if os.path.getmtime(recommendation_index.SOURCE_PATH) == _source_mtime:
+        return
+    with _data_lock:
+        if os.path.getmtime(recommendation_index.SOURCE_PATH) != _source_mtime:
+            with model_registry.timed("recommendation_index"):
+                recommendations_data, rec_index, _source_mtime = _load_recommendations()
+
+model_registry.register_warmup("recommendation_index", _refresh_if_changed)
 
 
 # Function to find the crime mentioned in the query
 def detect_crime(query):
     """Enhanced detection using both crime labels and their associated prompts"""
+    _refresh_if_changed()
     crime_data = recommendations_data["crime_prevention_recommendations"]
     
-    # Create combined text of crime + prompts for better matching
-    crime_texts = [
-        f"{entry['crime']} {' '.join(entry.get('prompts', []))}" 
-        for entry in crime_data
-    ]
-    
-    # Get embeddings for all crimes
-    query_embedding = sbert_model.encode(query, convert_to_tensor=True)
-    crime_embeddings = sbert_model.encode(crime_texts, convert_to_tensor=True)
-    
-    # Find top 3 matches
-    similarity_scores = util.pytorch_cos_sim(query_embedding, crime_embeddings)[0]
-    top_indices = torch.topk(similarity_scores, k=1).indices.tolist()
+    # Only the query is encoded; crime + prompts embeddings come from the index
+    query_embedding = embeddings.embed_query(query)
+    similarity_scores = rec_index.crime_embeddings @ query_embedding
+    top_indices = [int(np.argmax(similarity_scores))]
     
     return [crime_data[i]["crime"] for i in top_indices]
 
-# Function to get sentiment score
-def get_sentiment(text):
-    result = sentiment_pipeline(text)[0]
-    label = result["label"]
-    score = result["score"] if label == "POSITIVE" else -result["score"]
-    return score
-
-def get_recommendations(crimes):
-    """Get recommendations across multiple detected crimes"""
-    recommendations = []
-    for crime in crimes:
-        for entry in recommendations_data["crime_prevention_recommendations"]:
-            if entry["crime"] == crime:
-                for scenario in entry["scenarios"]:
-                    recommendations.extend(scenario["recommendations"])
-    
+# Scenario retrieval: how many scenarios to keep and the minimum cosine score
+SCENARIO_TOP_K = int(os.environ.get("SCENARIO_TOP_K", 3))
+SCENARIO_MIN_SCORE = float(os.environ.get("SCENARIO_MIN_SCORE", 0.2))
+
+def retrieve_recommendations(query, crimes, top_k=None, min_score=None):
+    """Two-stage retrieval: match the query against the detected crimes'
+    scenario descriptions and return recommendations from the top-k scenarios"""
+    _refresh_if_changed()
+    top_k = top_k or SCENARIO_TOP_K
+    min_score = SCENARIO_MIN_SCORE if min_score is None else min_score
+
+    crime_names = [entry["crime"] for entry in recommendations_data["crime_prevention_recommendations"]]
+    crime_ids = [i for i, name in enumerate(crime_names) if name in crimes]
+    candidates = np.flatnonzero(np.isin(rec_index.scenario_owner, crime_ids))
+    if candidates.size == 0:
+        return []
+
+    scores = rec_index.scenario_embeddings[candidates] @ embeddings.embed_query(query)
+    order = np.argsort(-scores)[:top_k]
+    # Always keep the best scenario so a weak match still yields advice
+    selected = [candidates[i] for rank, i in enumerate(order) if rank == 0 or scores[i] >= min_score]
 
-    return recommendations
+    texts = rec_index.texts
+    selected = set(int(i) for i in selected)
+    return [
+        rec for rec, owner in zip(texts["recommendations"], texts["recommendation_owner"])
+        if owner in selected
+    ]
 
-def score_and_sort_recommendations(user_query, all_recommendations):
+def score_and_sort_recommendations(user_query, all_recommendations, batch_size=None):
     """Score and sort recommendations based on sentiment similarity"""
-    user_sentiment = get_sentiment(user_query)
-    
+    # Recommendation scores come from the index; anything not in it is scored
+    # together with the query in a single batched pass
+    _refresh_if_changed()
+    unknown = [rec for rec in dict.fromkeys(all_recommendations) if rec_index.sentiment_of(rec) is None]
+    scores = get_sentiments([user_query] + unknown, batch_size=batch_size)
+    user_sentiment = scores[0]
+    fresh_scores = dict(zip(unknown, scores[1:]))
+
     scored_recs = []
     for rec in all_recommendations:
-        rec_sentiment = get_sentiment(rec)
-        sentiment_diff = abs(user_sentiment - rec_sentiment)
-        scored_recs.append((rec, sentiment_diff))
+        rec_sentiment = rec_index.sentiment_of(rec)
+        if rec_sentiment is None:
+            rec_sentiment = fresh_scores[rec]
+        scored_recs.append((rec, abs(user_sentiment - rec_sentiment)))
     
     # Get top 3 recommendations by sentiment match
     top_recommendations = sorted(scored_recs, key=lambda x: x[1])[:3]
@@ -73,11 +144,7 @@ def score_and_sort_recommendations(user_query, all_recommendations):
 def elaborate_recommendations(recommendations):
     """Elaborate recommendations using FLAN-T5"""
 
-    text_improver = pipeline(
-        "text2text-generation", 
-        model="google/flan-t5-small",
-        device=0 if torch.cuda.is_available() else -1
-    )
+    text_improver = model_registry.get("text_improver")
 
     elaborated_recommendations = []
     for rec in recommendations:
@@ -95,12 +162,8 @@ def elaborate_recommendations(recommendations):
 
 def batch_improve_recommendations(recommendations_list):
     """Process all recommendations in a single batch for better performance"""
-    
-    text_improver = pipeline(
-        "text2text-generation", 
-        model="google/flan-t5-small",
-        device=0 if torch.cuda.is_available() else -1
-    )
+
+    text_improver = model_registry.get("text_improver")
     
     # Create prompts for each recommendation
     prompts = [f"Convert this note into a helpful, complete sentence: {rec}" 
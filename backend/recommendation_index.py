@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from file_lock import file_lock
+
+# Precomputed embeddings and sentiment scores for recommendations.json.
+# The artifact is a pair of .npy files plus a JSON manifest; it is keyed by a
+# hash of the source JSON and the model, and rebuilt whenever either changes.
+# Each build goes into its own directory under recommendations/ and the
+# manifest naming the current one is replaced atomically, so files another
+# worker has memory-mapped are never rewritten. Rebuilds hold a file lock:
+# one worker builds, the others wait and load its result.
+SOURCE_PATH = './data/recommendations.json'
+INDEX_DIR = './data/index'
+BUILDS_DIR = 'recommendations'
+EMBEDDINGS_FILE = 'embeddings.npy'
+SENTIMENTS_FILE = 'sentiments.npy'
+MANIFEST_FILE = 'recommendation_manifest.json'
+LOCK_FILE = '.recommendations.lock'
+# Build directories kept: the current one and the one before, for workers
+# that have not switched over yet
+KEEP_BUILDS = 2
+
+
+def source_hash(path=SOURCE_PATH):
+    """SHA-256 of the recommendations JSON file"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def crime_text(entry):
+    """Text used to match a query against a crime entry"""
+    return f"{entry['crime']} {' '.join(entry.get('prompts', []))}"
+
+
+def flatten(recommendations_data):
+    """Walk the JSON in a fixed order and return texts with their owners"""
+    crimes, scenarios, recommendations = [], [], []
+    scenario_owner, recommendation_owner = [], []
+    for crime_idx, entry in enumerate(recommendations_data['crime_prevention_recommendations']):
+        crimes.append(crime_text(entry))
+        for scenario in entry['scenarios']:
+            scenario_owner.append(crime_idx)
+            scenarios.append(scenario['scenario'])
+            for rec in scenario['recommendations']:
+                recommendation_owner.append(len(scenarios) - 1)
+                recommendations.append(rec)
+    return {
+        'crimes': crimes,
+        'scenarios': scenarios,
+        'recommendations': recommendations,
+        'scenario_owner': scenario_owner,
+        'recommendation_owner': recommendation_owner,
+    }
+
+
+class RecommendationIndex:
+    """Read-only view over a built artifact"""
+
+    def __init__(self, manifest, embeddings, sentiments, texts):
+        self.manifest = manifest
+        self.embeddings = embeddings
+        self.sentiments = sentiments
+        self.texts = texts
+        sections = manifest['sections']
+        self.crime_embeddings = embeddings[slice(*sections['crimes'])]
+        self.scenario_embeddings = embeddings[slice(*sections['scenarios'])]
+        self.recommendation_embeddings = embeddings[slice(*sections['recommendations'])]
+        self.scenario_owner = np.asarray(texts['scenario_owner'], dtype=np.int32)
+        self.recommendation_owner = np.asarray(texts['recommendation_owner'], dtype=np.int32)
+        self._sentiment_by_text = dict(zip(texts['recommendations'], sentiments.tolist()))
+
+    def sentiment_of(self, recommendation):
+        """Precomputed sentiment of a recommendation, or None if unknown"""
+        return self._sentiment_by_text.get(recommendation)
+
+
+def build_lock(index_dir=INDEX_DIR):
+    return file_lock(os.path.join(index_dir, LOCK_FILE))
+
+
+def build(recommendations_data, encode, score_sentiments, model_name,
+          index_dir=INDEX_DIR, digest=None):
+    """Encode every crime, scenario and recommendation and write the artifact.
+
+    `encode` maps a list of texts to an (n, dim) array of L2-normalized
+    embeddings; `score_sentiments` maps a list of texts to signed scores.
+    Callers hold build_lock().
+    """
+    texts = flatten(recommendations_data)
+    ordered = texts['crimes'] + texts['scenarios'] + texts['recommendations']
+    embeddings = np.asarray(encode(ordered), dtype=np.float32)
+    sentiments = np.asarray(score_sentiments(texts['recommendations']), dtype=np.float32)
+
+    n_crimes, n_scenarios = len(texts['crimes']), len(texts['scenarios'])
+    digest = digest or source_hash()
+    directory = hashlib.sha256(f"{digest}\0{model_name}".encode('utf-8')).hexdigest()[:16]
+    manifest = {
+        'source_hash': digest,
+        'model': model_name,
+        'directory': directory,
+        'dim': int(embeddings.shape[1]),
+        'sections': {
+            'crimes': [0, n_crimes],
+            'scenarios': [n_crimes, n_crimes + n_scenarios],
+            'recommendations': [n_crimes + n_scenarios, len(ordered)],
+        },
+    }
+
+    builds_dir = os.path.join(index_dir, BUILDS_DIR)
+    target = os.path.join(builds_dir, directory)
+    tmp_dir = f"{target}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, EMBEDDINGS_FILE), embeddings)
+    np.save(os.path.join(tmp_dir, SENTIMENTS_FILE), sentiments)
+    # A directory for the same source and model holds the same arrays and may be mapped
+    if os.path.isdir(target):
+        shutil.rmtree(tmp_dir)
+    else:
+        os.rename(tmp_dir, target)
+
+    # The manifest switches readers over in one step, after the arrays are complete
+    manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    _prune(builds_dir, directory)
+
+    return RecommendationIndex(manifest, embeddings, sentiments, texts)
+
+
+def _prune(builds_dir, current):
+    """Remove all but the newest KEEP_BUILDS build directories"""
+    entries = [entry for entry in os.scandir(builds_dir) if entry.name != current]
+    builds = sorted((entry for entry in entries if entry.is_dir() and '.' not in entry.name),
+                    key=lambda entry: entry.stat().st_mtime, reverse=True)
+    keep = {entry.name for entry in builds[:KEEP_BUILDS - 1]}
+    for entry in entries:
+        if entry.name not in keep:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def load(recommendations_data, model_name, index_dir=INDEX_DIR, digest=None):
+    """Memory-map an existing artifact, or return None if it is missing or stale"""
+    manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+    if (manifest.get('source_hash') != (digest or source_hash()) or manifest.get('model') != model_name
+            or 'directory' not in manifest):
+        return None
+    build_dir = os.path.join(index_dir, BUILDS_DIR, manifest['directory'])
+    try:
+        embeddings = np.load(os.path.join(build_dir, EMBEDDINGS_FILE), mmap_mode='r')
+        sentiments = np.load(os.path.join(build_dir, SENTIMENTS_FILE), mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    return RecommendationIndex(manifest, embeddings, sentiments, flatten(recommendations_data))
+
+
+def load_or_build(recommendations_data, encode, score_sentiments, model_name, index_dir=INDEX_DIR):
+    """Load the artifact, rebuilding it first if the source JSON has changed"""
+    digest = source_hash()
+    index = load(recommendations_data, model_name, index_dir, digest)
+    if index is not None:
+        return index
+    with build_lock(index_dir):
+        # Another worker may have built it while this one waited
+        index = load(recommendations_data, model_name, index_dir, digest)
+        if index is None:
+            print("Recommendation index missing or stale, rebuilding...")
+            index = build(recommendations_data, encode, score_sentiments, model_name, index_dir, digest)
+    return index
+
+
+if __name__ == '__main__':
+    # Offline build step: python recommendation_index.py
+    import recommendation
+    recommendation.rebuild_index()
+    print(f"Recommendation index written to {INDEX_DIR}")
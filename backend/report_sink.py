@@ -0,0 +1,267 @@
+import csv
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+# Column order of reported crimes, shared by every backend
+REPORT_FIELDS = ['iyear', 'imonth', 'iday', 'location', 'latitude', 'longitude', 'summary', 'attacktype']
+
+
+def _complete_lines(path, position):
+    """Whole lines appended to a file after byte offset `position`, and the offset after them.
+
+    A line still being written by another process is left for the next read.
+    """
+    if not os.path.exists(path):
+        return [], position
+    with open(path, 'rb') as f:
+        f.seek(position)
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    return data[:end].decode('utf-8').splitlines(keepends=True), position + end
+
+
+class CsvBackend:
+    """Appends rows to a headerless CSV, as CrimeReporter always has"""
+
+    def __init__(self, path='./data/reported_crimes.csv'):
+        self.path = path
+
+    def write_batch(self, reports):
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            for report in reports:
+                writer.writerow(['' if report.get(field) is None else report.get(field) for field in REPORT_FIELDS])
+            f.flush()
+            os.fsync(f.fileno())
+
+    def read_all(self):
+        """Every stored report as a dict (values as strings, '' for missing)"""
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r', newline='') as f:
+            return [dict(zip(REPORT_FIELDS, row)) for row in csv.reader(f) if row]
+
+    def read_from(self, position):
+        """Reports written after `position` (a byte offset) and the new position"""
+        lines, position = _complete_lines(self.path, position)
+        return [dict(zip(REPORT_FIELDS, row)) for row in csv.reader(lines) if row], position
+
+    def reopen(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonlBackend:
+    """Append-only JSON lines, one report per line"""
+
+    def __init__(self, path='./data/reported_crimes.jsonl'):
+        self.path = path
+
+    def write_batch(self, reports):
+        with open(self.path, 'a') as f:
+            f.write(''.join(json.dumps({field: report.get(field) for field in REPORT_FIELDS}) + '\n'
+                            for report in reports))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def read_all(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def read_from(self, position):
+        lines, position = _complete_lines(self.path, position)
+        return [json.loads(line) for line in lines if line.strip()], position
+
+    def reopen(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SqliteBackend:
+    """SQLite table with indexes on date and attack type for later queries"""
+
+    def __init__(self, path='./data/reported_crimes.db'):
+        self.path = path
+        self._connect()
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS reported_crimes ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, iyear INTEGER, imonth INTEGER, iday INTEGER, '
+            'location TEXT, latitude REAL, longitude REAL, summary TEXT, attacktype TEXT)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_reported_date ON reported_crimes (iyear, imonth, iday)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_reported_attacktype ON reported_crimes (attacktype)')
+        self.conn.commit()
+
+    def _connect(self):
+        # Only the writer thread uses this connection after construction
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=FULL')
+
+    def write_batch(self, reports):
+        placeholders = ', '.join('?' for _ in REPORT_FIELDS)
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO reported_crimes ({', '.join(REPORT_FIELDS)}) VALUES ({placeholders})",
+                [[report.get(field) for field in REPORT_FIELDS] for report in reports]
+            )
+
+    def read_all(self):
+        # A separate connection, so readers never share the writer's; closing()
+        # because the connection's own context manager only commits
+        with closing(sqlite3.connect(self.path)) as conn:
+            rows = conn.execute(f"SELECT {', '.join(REPORT_FIELDS)} FROM reported_crimes ORDER BY id").fetchall()
+        return [dict(zip(REPORT_FIELDS, row)) for row in rows]
+
+    def read_from(self, position):
+        """Reports with an id above `position` and the highest id read"""
+        with closing(sqlite3.connect(self.path)) as conn:
+            rows = conn.execute(f"SELECT id, {', '.join(REPORT_FIELDS)} FROM reported_crimes WHERE id > ? ORDER BY id",
+                                (position,)).fetchall()
+        return [dict(zip(REPORT_FIELDS, row[1:])) for row in rows], rows[-1][0] if rows else position
+
+    def reopen(self):
+        """New connection for a forked process; the parent's must not be used"""
+        self._connect()
+
+    def close(self):
+        self.conn.close()
+
+
+BACKENDS = {
+    'csv': CsvBackend,
+    'jsonl': JsonlBackend,
+    'sqlite': SqliteBackend,
+}
+
+
+class ReportFeed:
+    """Reads the reports a backend has stored since the previous poll, whichever
+    process wrote them"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.position = 0
+        self._lock = threading.Lock()
+
+    def poll(self):
+        with self._lock:
+            reports, self.position = self.backend.read_from(self.position)
+            return reports
+
+
+class ReportSink:
+    """Queues reports in memory and writes them in batches from one thread.
+
+    A batch is flushed (and fsynced) once it holds `max_batch` reports or its
+    oldest report has waited `max_delay` seconds. With `durable=True`,
+    submit() blocks until the report's batch is on disk.
+    """
+
+    def __init__(self, backend, max_batch=50, max_delay=1.0, durable=False):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.durable = durable
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self._closed = False
+        self._start()
+
+    def _start(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='report-writer', daemon=True)
+        self._thread.start()
+
+    def after_fork(self):
+        """Restart the writer in a forked child, where the parent's thread does not exist.
+
+        Reports still queued in the parent are written by the parent.
+        """
+        if self._closed:
+            return
+        self.backend.reopen()
+        self._start()
+
+    def submit(self, report, durable=None):
+        """Queue a report; waits for it to reach disk in durable mode"""
+        if self._closed:
+            raise RuntimeError("Report sink is closed")
+        durable = self.durable if durable is None else durable
+        done = threading.Event() if durable else None
+        outcome = {}
+        self._queue.put((report, done, outcome))
+        if done:
+            done.wait()
+            if 'error' in outcome:
+                raise outcome['error']
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch):
+        error = None
+        try:
+            self.backend.write_batch([report for report, _, _ in batch])
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            error = e
+            self.failed += len(batch)
+            print(f"Warning: could not write {len(batch)} crime reports: {str(e)}")
+        for _, done, outcome in batch:
+            if done:
+                if error:
+                    outcome['error'] = error
+                done.set()
+
+    def close(self):
+        """Flush everything still queued and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self.backend.close()
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'batches': self.batches,
+            'failed': self.failed,
+        }
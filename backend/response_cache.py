@@ -0,0 +1,75 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """Serialized response bodies for read-only endpoints, tied to a dataset version.
+
+    Entries are keyed by request (path plus query string) and kept in an
+    LRU of `max_entries`. A body is a pure function of the dataset version
+    and the request, so the ETag is derived from those two alone and a
+    conditional request can be answered without touching the body. Seeing
+    a new version drops every entry.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    @staticmethod
+    def etag(version, key):
+        """Strong ETag value (unquoted) for a request against a dataset version"""
+        return hashlib.sha256(f"{version}\0{key}".encode('utf-8')).hexdigest()[:32]
+
+    def _check_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get_or_build(self, version, key, build):
+        """Cached body for key, calling build() to produce it on a miss"""
+        with self._lock:
+            self._check_version(version)
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return body
+            self.misses += 1
+
+        body = build()
+        with self._lock:
+            # Don't store a body built from a dataset that was replaced meanwhile
+            if version == self._version:
+                self._entries[key] = body
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return body
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self._version,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': sum(len(body) for body in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+            }
@@ -0,0 +1,182 @@
+import hashlib
+import math
+import os
+import numpy as np
+from forecast_cache import write_atomically
+from location import CLUSTERS_PATH, read_crime_clusters
+
+SNAPSHOT_PATH = './data/index/crime_clusters.npz'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance from one point to arrays of points, in km"""
+    lat, lon = math.radians(lat), math.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def build_snapshot(source_path=CLUSTERS_PATH, snapshot_path=SNAPSHOT_PATH):
+    """Convert crime_clusters.csv into typed arrays in a single .npz file"""
+    clusters = read_crime_clusters(source_path)
+    attack_types, attack_codes = np.unique(clusters['attack type'].fillna('Unknown').astype(str), return_inverse=True)
+    arrays = {
+        'source_hash': np.array(_file_hash(source_path)),
+        'lat': clusters['Latitude'].to_numpy(dtype=np.float64),
+        'lon': clusters['Longitude'].to_numpy(dtype=np.float64),
+        'year': clusters['year'].to_numpy(dtype=np.int16),
+        'month': clusters['month'].to_numpy(dtype=np.int8),
+        'day': clusters['day'].to_numpy(dtype=np.int8),
+        'attack_code': attack_codes.astype(np.int16),
+        'attack_types': attack_types.astype(str),
+        'city': clusters['city'].fillna('').astype(str).to_numpy(dtype=str),
+        'state': clusters['state'].fillna('').astype(str).to_numpy(dtype=str),
+    }
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    write_atomically(snapshot_path, lambda f: np.savez(f, **arrays))
+    return arrays
+
+
+def load_snapshot(source_path=CLUSTERS_PATH, snapshot_path=SNAPSHOT_PATH):
+    """Load the binary snapshot, rebuilding it if missing or older than the CSV"""
+    if os.path.exists(snapshot_path):
+        with np.load(snapshot_path, allow_pickle=False) as snapshot:
+            arrays = {name: snapshot[name] for name in snapshot.files}
+        if str(arrays['source_hash']) == _file_hash(source_path):
+            return arrays
+    return build_snapshot(source_path, snapshot_path)
+
+
+class SpatialIndex:
+    """Uniform lat/lon grid over the incident points.
+
+    Each cell of `cell_degrees` holds the indices of its points. Radius and
+    k-nearest queries only compute exact haversine distances for points in
+    the cells around the query.
+    """
+
+    def __init__(self, arrays, cell_degrees=0.5):
+        self.cell_degrees = cell_degrees
+        self.lat = arrays['lat']
+        self.lon = arrays['lon']
+        self.year = arrays['year']
+        self.month = arrays['month']
+        self.day = arrays['day']
+        self.attack_code = arrays['attack_code']
+        self.attack_types = [str(t) for t in arrays['attack_types']]
+        self.city = arrays['city']
+        self.state = arrays['state']
+
+        cells = {}
+        for i, key in enumerate(zip(*self._cell(self.lat, self.lon))):
+            cells.setdefault(key, []).append(i)
+        self.cells = {key: np.asarray(rows, dtype=np.int32) for key, rows in cells.items()}
+        # From any cell, this many rings cover the whole globe
+        self.max_ring = int(math.ceil(360 / cell_degrees))
+
+    @classmethod
+    def load(cls, source_path=CLUSTERS_PATH, snapshot_path=SNAPSHOT_PATH, cell_degrees=0.5):
+        return cls(load_snapshot(source_path, snapshot_path), cell_degrees)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _cell(self, lat, lon):
+        return (np.floor(np.asarray(lat) / self.cell_degrees).astype(int),
+                np.floor(np.asarray(lon) / self.cell_degrees).astype(int))
+
+    def _attack_codes(self, attack_type):
+        wanted = attack_type.strip().lower()
+        return [code for code, name in enumerate(self.attack_types) if wanted in name.lower()]
+
+    def _filter(self, rows, attack_type=None, year=None):
+        if attack_type:
+            rows = rows[np.isin(self.attack_code[rows], self._attack_codes(attack_type))]
+        if year is not None:
+            rows = rows[self.year[rows] == year]
+        return rows
+
+    def _rows_in_rings(self, cell_lat, cell_lon, ring_from, ring_to):
+        """Indices of points in cells at Chebyshev distance [ring_from, ring_to] from a cell"""
+        found = []
+        if (2 * ring_to + 1) ** 2 > len(self.cells):
+            # Wide searches are cheaper by walking the occupied cells
+            for (lat_key, lon_key), rows in self.cells.items():
+                if ring_from <= max(abs(lat_key - cell_lat), abs(lon_key - cell_lon)) <= ring_to:
+                    found.append(rows)
+            return np.concatenate(found) if found else np.empty(0, dtype=np.int32)
+        for dlat in range(-ring_to, ring_to + 1):
+            for dlon in range(-ring_to, ring_to + 1):
+                if max(abs(dlat), abs(dlon)) < ring_from:
+                    continue
+                rows = self.cells.get((cell_lat + dlat, cell_lon + dlon))
+                if rows is not None:
+                    found.append(rows)
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int32)
+
+    def _covered_km(self, lat, rings):
+        """Radius guaranteed to be fully inside `rings` cells around the query"""
+        span = rings * self.cell_degrees
+        shrink = math.cos(math.radians(min(abs(lat) + span, 90)))
+        return span * KM_PER_DEGREE * shrink
+
+    def radius(self, lat, lon, radius_km, attack_type=None, year=None, limit=None):
+        """Points within radius_km of (lat, lon), nearest first"""
+        lat_span = radius_km / KM_PER_DEGREE
+        lon_span = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(min(abs(lat) + lat_span, 89.9))), 1e-6))
+        rings = int(math.ceil(max(lat_span, lon_span) / self.cell_degrees)) + 1
+        cell_lat, cell_lon = self._cell(lat, lon)
+        rows = self._rows_in_rings(int(cell_lat), int(cell_lon), 0, min(rings, self.max_ring))
+        rows = self._filter(rows, attack_type, year)
+        distances = haversine_km(lat, lon, self.lat[rows], self.lon[rows])
+        keep = distances <= radius_km
+        rows, distances = rows[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')[:limit]
+        return self._results(rows[order], distances[order])
+
+    def nearest(self, lat, lon, k=5, attack_type=None, year=None, max_km=None):
+        """k nearest points to (lat, lon), optionally within max_km"""
+        cell_lat, cell_lon = (int(c) for c in self._cell(lat, lon))
+        rows = np.empty(0, dtype=np.int32)
+        searched = -1
+        ring = 1
+        while True:
+            new_rows = self._filter(self._rows_in_rings(cell_lat, cell_lon, searched + 1, ring), attack_type, year)
+            rows = np.concatenate([rows, new_rows])
+            searched = ring
+            covered = self._covered_km(lat, ring)
+            if len(rows) >= k:
+                distances = haversine_km(lat, lon, self.lat[rows], self.lon[rows])
+                if np.partition(distances, k - 1)[k - 1] <= covered:
+                    break
+            if (max_km is not None and covered >= max_km) or ring >= self.max_ring:
+                break
+            ring *= 2
+
+        distances = haversine_km(lat, lon, self.lat[rows], self.lon[rows])
+        if max_km is not None:
+            keep = distances <= max_km
+            rows, distances = rows[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')[:k]
+        return self._results(rows[order], distances[order])
+
+    def _results(self, rows, distances):
+        return [
+            {
+                'latitude': float(self.lat[i]),
+                'longitude': float(self.lon[i]),
+                'city': str(self.city[i]),
+                'state': str(self.state[i]),
+                'attack_type': self.attack_types[self.attack_code[i]],
+                'date': f"{int(self.year[i])}-{int(self.month[i]):02d}-{int(self.day[i]):02d}",
+                'distance_km': round(float(d), 3),
+            }
+            for i, d in zip(rows, distances)
+        ]
@@ -0,0 +1,66 @@
+import threading
+import pytest
+from location import LocationResolver
+
+
+class StubGeocoder:
+    """Stands in for the IP lookup: returns `result`, or raises it if it is an exception"""
+
+    def __init__(self, result, delay=None):
+        self.result = result
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.delay:
+            self.delay.wait(5)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+@pytest.fixture
+def clusters_path(tmp_path):
+    # Same layout as crime_clusters.csv: the second line repeats the header
+    path = tmp_path / 'clusters.csv'
+    path.write_text('city,Latitude,Longitude\ncity,Latitude,Longitude\n'
+                    ' Patna ,25.0,85.0\nPatna,26.0,86.0\nKochi,10.0,76.0\n', encoding='cp1252')
+    return str(path)
+
+
+def test_client_coordinates_skip_the_lookup(clusters_path):
+    geocode = StubGeocoder((1.0, 2.0, 'Here'))
+    resolver = LocationResolver(geocode=geocode, clusters_path=clusters_path)
+    assert resolver.resolve({'latitude': '3.5', 'longitude': 4, 'location': 'Kochi'}) == (3.5, 4.0, 'Kochi')
+    assert geocode.calls == 0
+
+
+def test_ip_lookup_is_cached(clusters_path):
+    geocode = StubGeocoder((1.0, 2.0, 'Here'))
+    resolver = LocationResolver(geocode=geocode, clusters_path=clusters_path)
+    assert resolver.resolve({}) == (1.0, 2.0, 'Here')
+    assert resolver.resolve({'location': 'Patna'}) == (1.0, 2.0, 'Here')
+    assert geocode.calls == 1
+
+
+def test_failed_lookup_falls_back_to_city_and_is_cached(clusters_path):
+    geocode = StubGeocoder(Exception("no network"))
+    resolver = LocationResolver(geocode=geocode, clusters_path=clusters_path)
+    assert resolver.resolve({'location': 'patna'}) == (25.5, 85.5, 'patna')
+    assert resolver.resolve({'location': 'Atlantis'}) == (None, None, 'Atlantis')
+    assert resolver.resolve({}) == (None, None, 'Unknown')
+    # The failure is remembered for failure_ttl instead of retried per report
+    assert geocode.calls == 1
+
+
+def test_slow_lookup_does_not_block(clusters_path):
+    release = threading.Event()
+    geocode = StubGeocoder((1.0, 2.0, 'Here'), delay=release)
+    resolver = LocationResolver(geocode=geocode, timeout=0.05, clusters_path=clusters_path)
+    assert resolver.resolve({'location': 'Kochi'}) == (10.0, 76.0, 'Kochi')
+    pending = resolver._pending
+    release.set()
+    pending.result(timeout=5)
+    assert resolver.resolve({}) == (1.0, 2.0, 'Here')
+    assert geocode.calls == 1
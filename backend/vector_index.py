@@ -0,0 +1,214 @@
+import hashlib
+import json
+import math
+import os
+from abc import ABC, abstractmethod
+import numpy as np
+from forecast_cache import write_atomically
+
+# Vector indexes over L2-normalized embeddings. Vectors are stored as
+# float16 and scored by dot product (= cosine similarity) in float32.
+# Indexes are saved as one .npz file keyed by a hash of the indexed texts
+# and the embedding model, and rebuilt when either changes.
+INDEX_DIR = './data/index'
+# Rows converted to float32 and scored at a time
+SCORE_CHUNK = 4096
+
+
+def _top_k(scores, k):
+    """Positions of the k highest scores, best first"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def _scores(vectors, query):
+    """Dot products of float16 rows with a float32 query, chunk by chunk"""
+    scores = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), SCORE_CHUNK):
+        scores[start:start + SCORE_CHUNK] = vectors[start:start + SCORE_CHUNK].astype(np.float32) @ query
+    return scores
+
+
+class VectorIndex(ABC):
+    """Base class: an index maps a query vector to its k best rows"""
+
+    name = None
+
+    @classmethod
+    @abstractmethod
+    def build(cls, vectors, **options):
+        """Index L2-normalized vectors"""
+
+    @abstractmethod
+    def __len__(self):
+        """Number of indexed vectors"""
+
+    @abstractmethod
+    def search(self, query, k=1):
+        """(row ids, scores) of the k most similar vectors, best first"""
+
+    @abstractmethod
+    def arrays(self):
+        """Arrays that fully describe the index, for save()"""
+
+    @classmethod
+    @abstractmethod
+    def from_arrays(cls, arrays, **options):
+        """Rebuild an index from the output of arrays()"""
+
+    def save(self, path, key):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomically(path, lambda f: np.savez(f, kind=np.array(self.name), key=np.array(key), **self.arrays()))
+
+
+class FlatIndex(VectorIndex):
+    """Exact brute-force search over every stored vector"""
+
+    name = 'flat'
+
+    def __init__(self, vectors, dtype=np.float16):
+        self.vectors = np.asarray(vectors, dtype=dtype)
+
+    @classmethod
+    def build(cls, vectors, **options):
+        return cls(vectors)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, query, k=1):
+        if len(self.vectors) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = _scores(self.vectors, np.asarray(query, dtype=np.float32))
+        top = _top_k(scores, k)
+        return top, scores[top]
+
+    def arrays(self):
+        return {'vectors': self.vectors}
+
+    @classmethod
+    def from_arrays(cls, arrays, **options):
+        return cls(arrays['vectors'])
+
+
+class IVFIndex(VectorIndex):
+    """Inverted-file index: approximate search over the nearest clusters only.
+
+    Vectors are grouped by spherical k-means into `n_lists` clusters (about
+    sqrt(n) by default) and stored contiguously per cluster. A query is
+    scored against the centroids first, then exactly against the vectors of
+    the `n_probe` best clusters. More probes trade speed for recall; with
+    n_probe >= n_lists the search is exact.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, vectors, ids, offsets, centroids, n_probe=8):
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+        self.centroids = centroids
+        self.n_probe = n_probe
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, n_probe=8, iterations=10, seed=0, **options):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        n_lists = max(1, min(n_lists or int(math.sqrt(n)), n))
+        if n == 0:
+            return cls(vectors.astype(np.float16), np.empty(0, dtype=np.int64),
+                       np.zeros(1, dtype=np.int64), np.empty((0, 0), dtype=np.float32), n_probe)
+
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(n, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = cls._assign(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            counts = np.bincount(assignment, minlength=n_lists)
+            # Reseed empty clusters from random vectors
+            empty = counts == 0
+            sums[empty] = vectors[rng.choice(n, int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        assignment = cls._assign(vectors, centroids)
+
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+        return cls(vectors[order].astype(np.float16), order.astype(np.int64), offsets.astype(np.int64),
+                   centroids.astype(np.float32), n_probe)
+
+    @staticmethod
+    def _assign(vectors, centroids):
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), SCORE_CHUNK):
+            assignment[start:start + SCORE_CHUNK] = np.argmax(vectors[start:start + SCORE_CHUNK] @ centroids.T, axis=1)
+        return assignment
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, k=1, n_probe=None):
+        if len(self.ids) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32)
+        lists = _top_k(self.centroids @ query, n_probe or self.n_probe)
+        rows = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+        scores = self.vectors[rows].astype(np.float32) @ query
+        top = _top_k(scores, k)
+        return self.ids[rows[top]], scores[top]
+
+    def arrays(self):
+        return {'vectors': self.vectors, 'ids': self.ids, 'offsets': self.offsets, 'centroids': self.centroids}
+
+    @classmethod
+    def from_arrays(cls, arrays, n_probe=8, **options):
+        return cls(arrays['vectors'], arrays['ids'], arrays['offsets'], arrays['centroids'], n_probe)
+
+
+INDEXES = {
+    FlatIndex.name: FlatIndex,
+    IVFIndex.name: IVFIndex,
+}
+
+DEFAULT_INDEX = os.environ.get('VECTOR_INDEX', FlatIndex.name)
+# Clusters searched per query by the IVF index
+IVF_N_PROBE = int(os.environ.get('VECTOR_INDEX_NPROBE', 8))
+
+
+def texts_key(texts, model_name, kind):
+    """Identity of an index: what was embedded, with which model, into which index type"""
+    payload = json.dumps([model_name, kind, list(texts)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def load(path, key, **options):
+    """Load a saved index, or return None if it is missing or was built from other texts"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as saved:
+            arrays = {name: saved[name] for name in saved.files}
+    except (OSError, ValueError):
+        return None
+    if str(arrays.pop('key')) != key:
+        return None
+    return INDEXES[str(arrays.pop('kind'))].from_arrays(arrays, **options)
+
+
+def load_or_build(texts, encode, path, model_name, kind=None, **options):
+    """Load the index for these texts from `path`, encoding and saving it if stale.
+
+    `encode` maps a list of texts to L2-normalized embeddings.
+    """
+    kind = kind or DEFAULT_INDEX
+    if kind == IVFIndex.name:
+        options.setdefault('n_probe', IVF_N_PROBE)
+    key = texts_key(texts, model_name, kind)
+    index = load(path, key, **options)
+    if index is None:
+        index = INDEXES[kind].build(encode(texts), **options)
+        index.save(path, key)
+    return index
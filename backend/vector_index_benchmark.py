@@ -0,0 +1,52 @@
+import sys
+import time
+import numpy as np
+import vector_index
+
+# Recall/latency benchmark of the IVF vector index against exact flat search:
+#   python vector_index_benchmark.py [n] [dim]
+
+
+def benchmark(n=20000, dim=384, queries=200, k=10, n_probes=(1, 4, 8, 16, 32), spread=2.0, seed=0):
+    """Recall@k and latency of the IVF index against exact flat search.
+
+    Uses random unit vectors scattered around n/50 topics; `spread` is the
+    noise scale around each topic (higher is harder for IVF).
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 50), dim)).astype(np.float32)
+    points = centers[rng.integers(len(centers), size=n + queries)]
+    points += spread * rng.standard_normal((n + queries, dim)).astype(np.float32)
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    vectors, probes = points[:n], points[n:]
+
+    start = time.perf_counter()
+    flat = vector_index.FlatIndex.build(vectors)
+    flat_build = time.perf_counter() - start
+    start = time.perf_counter()
+    ivf = vector_index.IVFIndex.build(vectors)
+    ivf_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    truth = [set(flat.search(q, k)[0].tolist()) for q in probes]
+    flat_ms = (time.perf_counter() - start) * 1000 / queries
+
+    rows = [{'index': 'flat', 'n_probe': None, 'recall': 1.0, 'ms_per_query': round(flat_ms, 3),
+             'build_seconds': round(flat_build, 3)}]
+    for n_probe in n_probes:
+        start = time.perf_counter()
+        found = [set(ivf.search(q, k, n_probe=n_probe)[0].tolist()) for q in probes]
+        ivf_ms = (time.perf_counter() - start) * 1000 / queries
+        recall = sum(len(f & t) for f, t in zip(found, truth)) / sum(len(t) for t in truth)
+        rows.append({'index': 'ivf', 'n_probe': n_probe, 'recall': round(recall, 4),
+                     'ms_per_query': round(ivf_ms, 3), 'build_seconds': round(ivf_build, 3)})
+    return rows
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    print(f"{n} vectors, dim {dim}, recall@10 against exact search")
+    for row in benchmark(n, dim):
+        print(f"{row['index']:<5} n_probe={str(row['n_probe']):<5} recall={row['recall']:.4f} "
+              f"{row['ms_per_query']:>8.3f} ms/query  build {row['build_seconds']:.2f}s")
@@ -0,0 +1,9 @@
+import os
+
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+# With preload_app the master imports this module once, so models, indexes
+# and the crime data snapshot are loaded before workers fork and shared
+# copy-on-write. Set PROTEGO_PRELOAD_MODELS=0 to keep lazy loading.
+os.environ.setdefault('PROTEGO_PRELOAD_MODELS', '1')
+
+from main import app  # noqa: E402
@@ -23,6 +23,8 @@ const CrimeAnalysisInput = () => {
   const [prevalentCrimes, setPrevalentCrimes] = useState([]);
   const [loading, setLoading] = useState(false);
   const [report, setReport] = useState(null);
+  // Shown instead of a report: a message from the backend or an error
+  const [message, setMessage] = useState(null);
 
   useEffect(() => {
     fetch(`${API_URL}/states`)
@@ -73,6 +75,7 @@ const CrimeAnalysisInput = () => {
     e.preventDefault();
     setLoading(true);
     setReport(null);
+    setMessage(null);
     try {
       const response = await fetch(`${API_URL}/analyze`, {
         method: "POST",
@@ -85,12 +88,35 @@ const CrimeAnalysisInput = () => {
           predict_years: parseInt(predictYears),
         }),
       });
-      const data = await response.json();
-      setReport(data);
+      let data = await response.json();
+      // Analyses run as background jobs; poll until the job finishes
+      if (response.status === 202) {
+        let job = data;
+        while (!["done", "failed", "cancelled"].includes(job.status)) {
+          await new Promise((resolve) => setTimeout(resolve, 1000));
+          job = await (await fetch(`${API_URL}/jobs/${data.job_id}`)).json();
+          if (job.error && !job.status) break;
+        }
+        if (job.status !== "done") {
+          setMessage(job.error || `Analysis ${job.status || "failed"}.`);
+          return;
+        }
+        data = job.result;
+      }
+      // The backend answers with a plain message when nothing matched
+      if (typeof data === "string") {
+        setMessage(data);
+      } else if (!response.ok || data?.error) {
+        setMessage(data?.error || "Analysis failed.");
+      } else {
+        setReport(data);
+      }
     } catch (error) {
       console.error("Error running analysis:", error);
+      setMessage("Could not reach the analysis service.");
+    } finally {
+      setLoading(false);
     }
-    setLoading(false);
   };
 
   // Format predictions data for the chart
@@ -170,6 +196,8 @@ const CrimeAnalysisInput = () => {
 
           {loading && <Progress className="mt-4" />}
 
+          {message && <p className="mt-4 text-red-500 text-sm">{message}</p>}
+
           {report && (
             <div className="mt-8 space-y-6">
               <Card>
@@ -245,7 +273,7 @@ const CrimeAnalysisInput = () => {
                     <h3 className="text-lg font-semibold mb-4">Crime Trend Plot</h3>
                     <div className="border rounded-lg overflow-hidden shadow-sm max-w-lg mx-auto">
                       <Image
-                        src={`${API_URL}/static/${report.plot_path.split('\\').pop()}`}
+                        src={`${API_URL}${report.plot_url}`}
                         alt="Crime Trend Plot"
                         width={600}
                         height={400}